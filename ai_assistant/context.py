@@ -0,0 +1,137 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Sum, F, Q, DecimalField
+from django.utils import timezone
+
+from products.models import Product, DailySalesRollup
+from products.caching import ANALYTICS_CACHE, cached_per_user
+
+# Longest lists included in the context; the token budget may cut them further
+LOW_STOCK_LIMIT = 10
+TOP_CATEGORY_LIMIT = 5
+# Rough characters per token of English text, used to turn the token budget into a length
+CHARS_PER_TOKEN = 4
+
+
+def category_totals(user):
+    """Product counts, units and stock values per category, in one grouped scan of the user's products"""
+    value = DecimalField(max_digits=16, decimal_places=2)
+    return list(Product.objects.filter(user=user).values('category_id', 'category__name').annotate(
+        products=Count('id'),
+        active=Count('id', filter=Q(status='active')),
+        units=Sum('quantity'),
+        stock_value=Sum(F('quantity') * F('cost'), output_field=value),
+        retail_value=Sum(F('quantity') * F('price'), output_field=value),
+        low_stock=Count('id', filter=Q(quantity__lte=F('minimum_stock'))),
+        out_of_stock=Count('id', filter=Q(quantity=0)),
+    ).order_by())
+
+
+def low_stock_products(user):
+    return list(Product.objects.filter(user=user, quantity__lte=F('minimum_stock')).order_by(
+        'quantity', 'name').values('name', 'sku', 'quantity', 'minimum_stock')[:LOW_STOCK_LIMIT])
+
+
+def sales_trend(user):
+    """Revenue and sale counts of the last 7 and 30 days against the periods before, from the daily rollup"""
+    today = timezone.localdate()
+    periods = {
+        'last_7': (today - timedelta(days=6), today),
+        'previous_7': (today - timedelta(days=13), today - timedelta(days=7)),
+        'last_30': (today - timedelta(days=29), today),
+        'previous_30': (today - timedelta(days=59), today - timedelta(days=30)),
+    }
+    aggregates = {}
+    for name, (start, end) in periods.items():
+        aggregates[f'{name}_revenue'] = Sum('revenue', filter=Q(date__range=(start, end)))
+        aggregates[f'{name}_sales'] = Sum('sale_count', filter=Q(date__range=(start, end)))
+    totals = DailySalesRollup.objects.filter(
+        user=user, product__isnull=True, category__isnull=True, date__gte=periods['previous_30'][0]
+    ).aggregate(**aggregates)
+    return {name: total or 0 for name, total in totals.items()}
+
+
+@cached_per_user(ANALYTICS_CACHE)
+def inventory_summary(user):
+    """Plain-data summary of a user's inventory for the assistant, in three aggregate queries.
+
+    Cached per user for VIEW_CACHE_TIMEOUT under the analytics namespace, so
+    product, category, stock and sales changes invalidate it.
+    """
+    categories = category_totals(user)
+    totals = {
+        name: sum(category[name] or 0 for category in categories)
+        for name in ['products', 'active', 'units', 'stock_value', 'retail_value', 'low_stock', 'out_of_stock']
+    }
+    top = sorted(categories, key=lambda category: (-(category['stock_value'] or 0), category['category__name']))
+    return {
+        'totals': totals,
+        'low_stock': low_stock_products(user),
+        'categories': [
+            {
+                'name': category['category__name'],
+                'product_count': category['products'],
+                'units': category['units'] or 0,
+                'stock_value': category['stock_value'] or 0,
+            }
+            for category in top[:TOP_CATEGORY_LIMIT]
+        ],
+        'sales': sales_trend(user),
+    }
+
+
+def _change(current, previous):
+    if not previous:
+        return ''
+    return f' ({(current - previous) / previous * 100:+.0f}% vs previous period)'
+
+
+def render_context(summary, max_tokens):
+    """Render a summary as compact text lines that fit in `max_tokens`.
+
+    Totals and the sales trend always come first; list entries are dropped from
+    the end until the text fits, so the prompt size stays bounded however many
+    products a user has.
+    """
+    totals = summary['totals']
+    sales = summary['sales']
+    header = [
+        f"Products: {totals['products']} ({totals['active']} active), {totals['units']} units in stock",
+        f"Stock value: ${totals['stock_value']:,.2f} at cost, ${totals['retail_value']:,.2f} at retail price",
+        f"Low stock: {totals['low_stock']} products at or below minimum, {totals['out_of_stock']} out of stock",
+        f"Sales last 7 days: {sales['last_7_sales']} sales, ${sales['last_7_revenue']:,.2f}"
+        f"{_change(sales['last_7_revenue'], sales['previous_7_revenue'])}",
+        f"Sales last 30 days: {sales['last_30_sales']} sales, ${sales['last_30_revenue']:,.2f}"
+        f"{_change(sales['last_30_revenue'], sales['previous_30_revenue'])}",
+    ]
+    low_stock = [
+        f"- {product['name']} (SKU {product['sku']}): {product['quantity']} left, minimum {product['minimum_stock']}"
+        for product in summary['low_stock']
+    ]
+    categories = [
+        f"- {category['name']}: {category['product_count']} products, {category['units']} units, "
+        f"${category['stock_value']:,.2f}"
+        for category in summary['categories']
+    ]
+
+    def render():
+        lines = list(header)
+        if low_stock:
+            lines += ['Lowest stock products:'] + low_stock
+        if categories:
+            lines += ['Top categories by stock value:'] + categories
+        return '\n'.join(lines)
+
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    text = render()
+    while len(text) > max_chars and (low_stock or categories):
+        # Trim the longer list first so both keep their most important entries
+        (low_stock if len(low_stock) >= len(categories) else categories).pop()
+        text = render()
+    return text[:max_chars]
+
+
+def get_inventory_context(user):
+    """Token-budgeted inventory summary of `user` for the assistant's prompt"""
+    return render_context(inventory_summary(user), getattr(settings, 'AI_CONTEXT_MAX_TOKENS', 400))
@@ -1,22 +1,149 @@
-import os
+import re
 import json
-import google.generativeai as genai
-from dotenv import load_dotenv
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import unicodedata
+from contextlib import aclosing, asynccontextmanager
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.cache import cache
+
+from invent.clients import gemini, gemini_api_key
+from products.caching import ANALYTICS_CACHE, user_cache_key
+
+from .context import get_inventory_context, inventory_summary
+
+logger = logging.getLogger(__name__)
+
+
+class AIBusyError(Exception):
+    """No model call slot became free in time"""
+
+
+class ConcurrencyLimiter:
+    """Caps the number of concurrent model calls in this process.
+
+    Uses a process-wide semaphore rather than an asyncio one, so the limit
+    also holds when each request runs in its own event loop (async views
+    under WSGI).
+    """
+
+    def __init__(self, limit):
+        self.semaphore = threading.BoundedSemaphore(limit)
+
+    @asynccontextmanager
+    async def slot(self, timeout):
+        """Wait up to `timeout` seconds for a free slot, or raise AIBusyError"""
+        deadline = time.monotonic() + timeout
+        while not self.semaphore.acquire(blocking=False):
+            if time.monotonic() >= deadline:
+                raise AIBusyError()
+            await asyncio.sleep(0.05)
+        try:
+            yield
+        finally:
+            self.semaphore.release()
+
+
+# Words that don't change what is being asked; dropped when matching cached answers
+QUERY_STOPWORDS = frozenset(
+    "a an the is are am was were be been do does did i me my mine we our us you your it its "
+    "please can could would will should show tell give list what whats which how of in on "
+    "for to at about this there right now currently".split()
+)
+
+
+def normalize_query(query):
+    """Reduce a question to its sorted keywords, so rephrasings like
+    "What's low in stock?" and "low stock please" share a cached answer"""
+    text = unicodedata.normalize('NFKC', query).lower().replace("'", "").replace("\u2019", "")
+    words = re.findall(r"[a-z0-9]+", text)
+    keywords = [word for word in words if word not in QUERY_STOPWORDS] or words
+    # Crude plural folding: "sales" and "sale", "products" and "product"
+    keywords = {word[:-1] if len(word) > 3 and word.endswith('s') and not word.endswith('ss') else word
+                for word in keywords}
+    return ' '.join(sorted(keywords))
+
+
+class ResponseCache:
+    """Assistant answers kept in the Django cache per user, normalized query and context fingerprint.
+
+    Keys carry the user's analytics cache version, which is bumped whenever their
+    products, stock or sales change, so answers never outlive the data they were
+    based on. Each user keeps at most AI_RESPONSE_CACHE_MAX_ENTRIES answers; an
+    index of their keys in least to most recently used order picks the ones to
+    evict (best effort: concurrent writers may drop each other's index updates).
+    """
+    prefix = 'ai_assistant:responses'
+
+    @property
+    def timeout(self):
+        return getattr(settings, 'AI_RESPONSE_CACHE_TTL', 600)
+
+    def key(self, user, query, fingerprint):
+        return user_cache_key(ANALYTICS_CACHE, user.pk, self.prefix, fingerprint, normalize_query(query))
+
+    def _index_key(self, user_id):
+        return f'{self.prefix}:index:{user_id}'
+
+    def _counter_key(self, name):
+        return f'{self.prefix}:{name}'
+
+    def _count(self, name):
+        try:
+            cache.incr(self._counter_key(name))
+        except ValueError:
+            cache.add(self._counter_key(name), 1, None)
+
+    def _touch(self, user_id, key):
+        """Move `key` to the most recently used end of the user's index, evicting past the limit"""
+        index_key = self._index_key(user_id)
+        keys = [other for other in cache.get(index_key, []) if other != key]
+        keys.append(key)
+        limit = getattr(settings, 'AI_RESPONSE_CACHE_MAX_ENTRIES', 50)
+        if len(keys) > limit:
+            cache.delete_many(keys[:-limit])
+            keys = keys[-limit:]
+        cache.set(index_key, keys, self.timeout)
+
+    def get(self, key, user_id):
+        response = cache.get(key)
+        self._count('misses' if response is None else 'hits')
+        if response is not None:
+            self._touch(user_id, key)
+        return response
+
+    def set(self, key, user_id, response):
+        cache.set(key, response, self.timeout)
+        self._touch(user_id, key)
+
+    def stats(self):
+        """Hit and miss counts across all processes since the counters were last reset"""
+        counts = cache.get_many([self._counter_key('hits'), self._counter_key('misses')])
+        hits = counts.get(self._counter_key('hits'), 0)
+        misses = counts.get(self._counter_key('misses'), 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+    def reset_stats(self):
+        cache.delete_many([self._counter_key('hits'), self._counter_key('misses')])
 
-# Load environment variables from .env file
-load_dotenv()
 
 class AIService:
     """Service for interacting with Google Gemini AI API"""
 
     def __init__(self):
-        # Get API key from environment variables
-        self.api_key = os.environ.get('GOOGLE_GEMINI_API_KEY', 'your-gemini-api-key-here')
         self.model = "gemini-1.5-pro"  # You can change this to a different model
-
-        # Configure the Gemini API
-        genai.configure(api_key=self.api_key)
+        # The Gemini SDK is imported and configured on the first real query (see invent.clients)
+        self.limiter = ConcurrencyLimiter(getattr(settings, 'AI_MAX_CONCURRENT_REQUESTS', 8))
+        self.response_cache = ResponseCache()
 
     def create_prompt(self, query, user=None):
         """Create a prompt for the AI with inventory context"""
@@ -26,75 +153,230 @@ class AIService:
             "Keep your answers concise and focused on inventory management."
         )
 
-        # In Phase 1, we're not adding specific inventory data to the context
-        # In later phases, we would fetch relevant data here
-
-        # Combine system message and user query
+        # Combine system message, the user's inventory summary and the query
+        if user is not None:
+            context = get_inventory_context(user)
+            return f"{system_message}\n\nCurrent inventory data:\n{context}\n\nUser query: {query}"
         prompt = f"{system_message}\n\nUser query: {query}"
         return prompt
 
+    def context_fingerprint(self, user):
+        """Digest of everything besides the question that shapes an answer: model and prompt context"""
+        return hashlib.md5(f"{self.model}\n{self.create_prompt('', user)}".encode()).hexdigest()
+
+    def cached_response(self, query, user=None):
+        """Look up a cached answer; returns (key to store a fresh answer under, payload or None).
+
+        Answers are only cached per user, so anonymous calls get no key.
+        """
+        if user is None or not self.response_cache.timeout:
+            return None, None
+        key = self.response_cache.key(user, query, self.context_fingerprint(user))
+        response = self.response_cache.get(key, user.pk)
+        if response is None:
+            logger.debug("AI response cache miss for user %s", user.pk)
+            return key, None
+        logger.debug("AI response cache hit for user %s", user.pk)
+        return key, {
+            "success": True,
+            "cached": True,
+            "response": response
+        }
+
+    def remember_response(self, key, user, result):
+        if key and result.get("success"):
+            self.response_cache.set(key, user.pk, result["response"])
+
+    @property
+    def api_key(self):
+        return gemini_api_key()
+
+    @property
+    def use_real_api(self):
+        """Whether queries go to Gemini; without an API key (or with AI_SIMULATE) canned answers are used"""
+        return self.api_key != 'your-gemini-api-key-here' and not getattr(settings, 'AI_SIMULATE', False)
+
+    def simulated_response(self, query, user=None):
+        """Canned answer used when no API key is configured, e.g. in development and load tests.
+
+        Answers quote the user's real inventory summary, so they match what the model would see.
+        """
+        summary = inventory_summary(user) if user is not None else None
+        query = query.lower()
+        if summary is None:
+            return {
+                "success": True,
+                "response": "I'm your inventory assistant. You can ask me questions about your products, stock levels, sales, and more."
+            }
+
+        totals = summary["totals"]
+        if "low" in query or "reorder" in query:
+            response = f"There are currently {totals['low_stock']} products at or below their minimum stock levels."
+            if summary["low_stock"]:
+                product = summary["low_stock"][0]
+                response += (f" The most critical is '{product['name']}' with only {product['quantity']} "
+                             f"units remaining (minimum: {product['minimum_stock']}).")
+        elif "sale" in query or "revenue" in query:
+            sales = summary["sales"]
+            response = (f"Your sales over the last 30 days total ${sales['last_30_revenue']:,.2f} "
+                        f"across {sales['last_30_sales']} sales, ${sales['last_7_revenue']:,.2f} of it in the last 7 days.")
+        elif "product" in query or "stock" in query or "inventory" in query:
+            response = (f"Based on the current inventory data, you have {totals['products']} products with "
+                        f"{totals['units']} units in stock, worth ${totals['stock_value']:,.2f} at cost.")
+            if summary["categories"]:
+                category = summary["categories"][0]
+                response += (f" The category with the highest stock value is '{category['name']}' "
+                             f"with {category['units']} units.")
+        else:
+            response = (f"I'm your inventory assistant. You have {totals['products']} products, "
+                        f"{totals['low_stock']} of them low on stock. Ask me about your products, stock levels or sales.")
+        return {
+            "success": True,
+            "response": response
+        }
+
+    def model_response(self, response):
+        """Turn a Gemini response into the JSON payload returned to the sidebar"""
+        if response and hasattr(response, 'text'):
+            return {
+                "success": True,
+                "response": response.text
+            }
+        return {
+            "success": False,
+            "error": "Failed to get a valid response from Gemini API"
+        }
+
     def query_ai(self, query, user=None):
         """Send a query to the Google Gemini API and get a response"""
         try:
-            # Check if we should use the real API or simulated responses
-            use_real_api = self.api_key != 'your-gemini-api-key-here'
+            key, cached = self.cached_response(query, user)
+            if cached:
+                return cached
 
-            # Print debugging information
-            print(f"API Key: {self.api_key[:5]}...{self.api_key[-5:] if len(self.api_key) > 10 else ''}")
-            print(f"Using real API: {use_real_api}")
-            print(f"Model: {self.model}")
-
-            if use_real_api:
-                # Create the prompt
+            if self.use_real_api:
                 prompt = self.create_prompt(query, user)
-                print(f"Prompt: {prompt[:100]}...")
+                model = gemini.get().GenerativeModel(self.model)
+                logger.debug("Sending request to Gemini model %s", self.model)
+                result = self.model_response(model.generate_content(prompt))
+            else:
+                time.sleep(getattr(settings, 'AI_SIMULATED_LATENCY', 0))
+                result = self.simulated_response(query, user)
 
-                # Initialize the model
-                model = genai.GenerativeModel(self.model)
+            self.remember_response(key, user, result)
+            return result
 
-                # Generate response
-                print("Sending request to Gemini API...")
-                response = model.generate_content(prompt)
-                print(f"Response received: {response}")
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Error: {str(e)}"
+            }
 
-                if response and hasattr(response, 'text'):
-                    return {
-                        "success": True,
-                        "response": response.text
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "error": "Failed to get a valid response from Gemini API"
-                    }
-            else:
-                # Simulated response for Phase 1 (when no API key is provided)
-                if "product" in query.lower() and "stock" in query.lower():
-                    return {
-                        "success": True,
-                        "response": "Based on the current inventory data, you have 157 products in stock across all categories. The category with the highest stock is 'Electronics' with 42 items."
-                    }
-                elif "sales" in query.lower():
-                    return {
-                        "success": True,
-                        "response": "Your total sales for the current month are $24,580. This is a 12% increase compared to the same period last month."
-                    }
-                elif "low stock" in query.lower():
-                    return {
-                        "success": True,
-                        "response": "There are currently 8 products that are below their minimum stock levels. The most critical is 'Wireless Headphones' with only 2 units remaining (minimum: 10)."
-                    }
+    async def query_ai_async(self, query, user=None):
+        """Non-blocking query_ai for async views.
+
+        The model call is awaited with AI_REQUEST_TIMEOUT and counts against the
+        per-process AI_MAX_CONCURRENT_REQUESTS limit; if the client goes away the
+        view task is cancelled and the pending model call with it. Cached answers
+        are returned without taking a slot.
+        """
+        try:
+            key, cached = await sync_to_async(self.cached_response)(query, user)
+            if cached:
+                return cached
+
+            timeout = getattr(settings, 'AI_REQUEST_TIMEOUT', 30)
+            async with self.limiter.slot(getattr(settings, 'AI_QUEUE_TIMEOUT', 5)):
+                if self.use_real_api:
+                    prompt = await sync_to_async(self.create_prompt)(query, user)
+                    # The first call imports the SDK; keep that off the event loop
+                    model = (await sync_to_async(gemini.get)()).GenerativeModel(self.model)
+                    logger.debug("Sending async request to Gemini model %s", self.model)
+                    response = await asyncio.wait_for(model.generate_content_async(prompt), timeout=timeout)
+                    result = self.model_response(response)
                 else:
-                    return {
-                        "success": True,
-                        "response": "I'm your inventory assistant. You can ask me questions about your products, stock levels, sales, and more. For Phase 1, I have limited capabilities, but I'll be able to provide more detailed information in future updates."
-                    }
+                    # Simulated latency is cut off like a slow model call, so load tests see timeouts too
+                    await asyncio.wait_for(asyncio.sleep(getattr(settings, 'AI_SIMULATED_LATENCY', 0)), timeout=timeout)
+                    result = await sync_to_async(self.simulated_response)(query, user)
+
+            await sync_to_async(self.remember_response)(key, user, result)
+            return result
 
         except Exception as e:
+            return self.error_response(e)
+
+    def error_response(self, error):
+        """JSON payload for a failed async query; busy and timeout errors are flagged for the view"""
+        if isinstance(error, AIBusyError):
             return {
                 "success": False,
-                "error": f"Error: {str(e)}"
+                "busy": True,
+                "error": "The assistant is handling too many questions right now, please try again in a moment."
+            }
+        if isinstance(error, asyncio.TimeoutError):
+            return {
+                "success": False,
+                "timeout": True,
+                "error": "The assistant took too long to answer, please try again."
             }
+        return {
+            "success": False,
+            "error": f"Error: {str(error)}"
+        }
+
+    async def simulated_stream(self, query, user=None):
+        """Stream the canned answer word by word, like the model would"""
+        delay = getattr(settings, 'AI_SIMULATED_STREAM_DELAY', 0.03)
+        result = await sync_to_async(self.simulated_response)(query, user)
+        words = result["response"].split(' ')
+        for index, word in enumerate(words):
+            await asyncio.sleep(delay)
+            yield word if index == 0 else ' ' + word
+
+    async def model_stream(self, query, user=None):
+        """Stream Gemini's answer chunk by chunk, allowing AI_REQUEST_TIMEOUT between chunks"""
+        timeout = getattr(settings, 'AI_REQUEST_TIMEOUT', 30)
+        prompt = await sync_to_async(self.create_prompt)(query, user)
+        model = (await sync_to_async(gemini.get)()).GenerativeModel(self.model)
+        logger.debug("Sending streaming request to Gemini model %s", self.model)
+        response = await asyncio.wait_for(model.generate_content_async(prompt, stream=True), timeout=timeout)
+        chunks = aiter(response)
+        while True:
+            try:
+                chunk = await asyncio.wait_for(anext(chunks), timeout=timeout)
+            except StopAsyncIteration:
+                break
+            if chunk.text:
+                yield chunk.text
+
+    async def stream_ai_async(self, query, user=None):
+        """Streaming query_ai_async: yields {"text": ...} as the answer is generated.
+
+        Holds a limiter slot until the stream ends or is closed; a failure ends
+        the stream with the same error payload query_ai_async would return.
+        A cached answer is sent as a single chunk, and a completed stream is cached.
+        """
+        try:
+            key, cached = await sync_to_async(self.cached_response)(query, user)
+            if cached:
+                yield {"text": cached["response"]}
+                return
+
+            parts = []
+            async with self.limiter.slot(getattr(settings, 'AI_QUEUE_TIMEOUT', 5)):
+                if self.use_real_api:
+                    chunks = self.model_stream(query, user)
+                else:
+                    chunks = self.simulated_stream(query, user)
+                # Close the model stream too if the client goes away mid-answer
+                async with aclosing(chunks):
+                    async for text in chunks:
+                        parts.append(text)
+                        yield {"text": text}
+
+            await sync_to_async(self.remember_response)(key, user, {"success": True, "response": "".join(parts)})
+        except Exception as e:
+            yield self.error_response(e)
 
 # Create a singleton instance
 ai_service = AIService()
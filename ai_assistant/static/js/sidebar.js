@@ -42,25 +42,9 @@ document.addEventListener('DOMContentLoaded', function() {
         // Clear input
         aiInput.value = '';
         
-        // Send query to backend
-        fetch('/ai/query/', {
-            method: 'POST',
-            headers: {
-                'Content-Type': 'application/json',
-                'X-CSRFToken': getCsrfToken()
-            },
-            body: JSON.stringify({ query: query })
-        })
-        .then(response => response.json())
-        .then(data => {
-            if (data.success) {
-                // Add AI response to chat
-                addMessage(data.response, 'assistant');
-            } else {
-                // Add error message
-                addMessage('Error: ' + (data.error || 'Something went wrong'), 'assistant error');
-            }
-        })
+        // Stream the answer where the browser can read response bodies, otherwise wait for it whole
+        const request = window.ReadableStream && window.TextDecoder ? streamQuery(query) : sendQuery(query);
+        request
         .catch(error => {
             // Add error message
             addMessage('Error: ' + error.message, 'assistant error');
@@ -74,6 +58,78 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
     
+    // Send a query and show the whole answer once it is ready
+    function sendQuery(query) {
+        return postQuery('/ai/query/', query)
+        .then(response => response.json())
+        .then(showResult);
+    }
+    
+    // Send a query and show the answer as it is generated (server-sent events)
+    function streamQuery(query) {
+        return postQuery('/ai/query/stream/', query).then(response => {
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!response.body || !contentType.startsWith('text/event-stream')) {
+                return response.json().then(showResult);
+            }
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let content = null;
+            
+            function handleEvent(block) {
+                let event = 'message';
+                let data = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                if (!data) return;
+                const payload = JSON.parse(data);
+                if (event === 'error') {
+                    addMessage('Error: ' + (payload.error || 'Something went wrong'), 'assistant error');
+                } else if (payload.text) {
+                    if (!content) content = addMessage('', 'assistant');
+                    content.textContent += payload.text;
+                    aiMessages.scrollTop = aiMessages.scrollHeight;
+                }
+            }
+            
+            function read() {
+                return reader.read().then(({ done, value }) => {
+                    buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+                    const events = buffer.split('\n\n');
+                    buffer = events.pop();
+                    events.forEach(handleEvent);
+                    if (!done) return read();
+                });
+            }
+            return read();
+        });
+    }
+    
+    function postQuery(url, query) {
+        return fetch(url, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCsrfToken()
+            },
+            body: JSON.stringify({ query: query })
+        });
+    }
+    
+    function showResult(data) {
+        if (data.success) {
+            // Add AI response to chat
+            addMessage(data.response, 'assistant');
+        } else {
+            // Add error message
+            addMessage('Error: ' + (data.error || 'Something went wrong'), 'assistant error');
+        }
+    }
+    
     // Function to add a message to the chat
     function addMessage(content, role) {
         const messageDiv = document.createElement('div');
@@ -88,6 +144,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Scroll to bottom
         aiMessages.scrollTop = aiMessages.scrollHeight;
+        return messageContent;
     }
     
     // Function to get CSRF token
@@ -1,3 +1,148 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products.models import Category, Product
+
+from .context import CHARS_PER_TOKEN, get_inventory_context
+from .services import AIBusyError, AIService, ConcurrencyLimiter, normalize_query
+
+
+@override_settings(AI_SIMULATE=True, AI_SIMULATED_LATENCY=0, AI_RESPONSE_CACHE_TTL=600)
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='password')
+        cls.other_user = User.objects.create_user('bob', password='password')
+        category = Category.objects.create(user=cls.user, name='Tools')
+        cls.product = Product.objects.create(
+            user=cls.user, category=category, name='Hammer', sku='HAM-1', price=10, cost=6,
+            quantity=2, minimum_stock=5,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.service = AIService()
+
+    def test_rephrasings_normalize_to_the_same_query(self):
+        self.assertEqual(normalize_query("What's low in stock?"), normalize_query("low stock please"))
+        self.assertEqual(normalize_query("Show me my sales"), normalize_query("sale"))
+        self.assertNotEqual(normalize_query("low stock"), normalize_query("sales"))
+
+    def test_rephrasing_is_answered_from_the_cache(self):
+        first = self.service.query_ai("What's low in stock?", self.user)
+        self.assertTrue(first['success'])
+        self.assertNotIn('cached', first)
+
+        second = self.service.query_ai("low stock please", self.user)
+        self.assertTrue(second['cached'])
+        self.assertEqual(second['response'], first['response'])
+
+    def test_other_users_do_not_share_answers(self):
+        self.service.query_ai("What's low in stock?", self.user)
+        self.assertNotIn('cached', self.service.query_ai("What's low in stock?", self.other_user))
+
+    def test_inventory_change_drops_cached_answers(self):
+        self.service.query_ai("What's low in stock?", self.user)
+        self.product.quantity = 50
+        self.product.save()
+
+        answer = self.service.query_ai("What's low in stock?", self.user)
+        self.assertNotIn('cached', answer)
+        self.assertIn('0 products', answer['response'])
+
+
+@override_settings(AI_SIMULATE=True, AI_SIMULATED_LATENCY=0, AI_SIMULATED_STREAM_DELAY=0)
+class QueryValidationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_malformed_bodies_are_rejected(self):
+        for name in ['query_ai', 'query_ai_stream']:
+            for body in ['not json', '[]', '"text"', '{"query": 5}', '{"query": ["low stock"]}', '{"query": "  "}']:
+                response = self.client.post(reverse(name), body, content_type='application/json')
+                self.assertEqual(response.status_code, 400, (name, body))
+                self.assertFalse(response.json()['success'])
+                self.assertTrue(response.json()['error'])
+
+
+@override_settings(AI_SIMULATE=True, AI_MAX_CONCURRENT_REQUESTS=1, AI_QUEUE_TIMEOUT=0.1,
+                   AI_SIMULATED_LATENCY=0.3, AI_REQUEST_TIMEOUT=5, AI_RESPONSE_CACHE_TTL=0)
+class AsyncQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='password')
+
+    async def test_limiter_gives_up_after_queue_timeout(self):
+        limiter = ConcurrencyLimiter(1)
+        async with limiter.slot(1):
+            with self.assertRaises(AIBusyError):
+                async with limiter.slot(0.05):
+                    pass
+        async with limiter.slot(0.05):
+            pass
+
+    async def test_queries_beyond_the_limit_are_busy(self):
+        service = AIService()
+        results = await asyncio.gather(service.query_ai_async('hello'), service.query_ai_async('hello'))
+        self.assertEqual(sorted(bool(result.get('busy')) for result in results), [False, True])
+        self.assertTrue(any(result['success'] for result in results))
+
+        # The slot is free again once the first answer is done
+        self.assertTrue((await service.query_ai_async('hello'))['success'])
+
+    @override_settings(AI_REQUEST_TIMEOUT=0.05)
+    async def test_slow_answers_time_out(self):
+        result = await AIService().query_ai_async('hello')
+        self.assertFalse(result['success'])
+        self.assertTrue(result['timeout'])
+
+    def test_view_maps_busy_and_timeout_to_status_codes(self):
+        self.client.force_login(self.user)
+        for result, status in [
+            ({'success': True, 'response': 'Hi'}, 200),
+            ({'success': False, 'busy': True, 'error': 'busy'}, 503),
+            ({'success': False, 'timeout': True, 'error': 'slow'}, 504),
+        ]:
+            with mock.patch('ai_assistant.views.ai_service.query_ai_async', return_value=result):
+                response = self.client.post(reverse('query_ai'), {'query': 'hello'}, content_type='application/json')
+            self.assertEqual(response.status_code, status)
+            self.assertEqual(response.json(), result)
+
+
+class InventoryContextTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='password')
+        categories = Category.objects.bulk_create(
+            Category(user=cls.user, name=f'Category with a fairly long name {i}') for i in range(40))
+        Product.objects.bulk_create(
+            Product(user=cls.user, category=categories[i % len(categories)], name=f'Low stock product {i} ' + 'x' * 40,
+                    sku=f'SKU-{i}', price=10, cost=6, quantity=i % 3, minimum_stock=5)
+            for i in range(500))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_context_stays_within_token_budget(self):
+        for max_tokens in [60, 150, 300]:
+            with self.subTest(max_tokens=max_tokens), self.settings(AI_CONTEXT_MAX_TOKENS=max_tokens):
+                context = get_inventory_context(self.user)
+                self.assertLessEqual(len(context), max_tokens * CHARS_PER_TOKEN)
+                self.assertTrue(context.startswith('Products: 500 (500 active)'))
+
+    def test_larger_budget_keeps_more_entries(self):
+        with self.settings(AI_CONTEXT_MAX_TOKENS=150):
+            small = get_inventory_context(self.user)
+        with self.settings(AI_CONTEXT_MAX_TOKENS=300):
+            large = get_inventory_context(self.user)
+        self.assertGreater(large.count('\n- '), small.count('\n- '))
+        self.assertIn('Lowest stock products:', large)
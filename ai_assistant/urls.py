@@ -4,4 +4,5 @@ from . import views
 urlpatterns = [
     path('sidebar/', views.ai_sidebar, name='ai_sidebar'),
     path('query/', views.query_ai, name='query_ai'),
+    path('query/stream/', views.query_ai_stream, name='query_ai_stream'),
 ]
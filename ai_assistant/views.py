@@ -1,5 +1,5 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 import json
@@ -11,26 +11,71 @@ def ai_sidebar(request):
     """Render the AI assistant sidebar"""
     return render(request, 'ai_assistant/sidebar.html')
 
+def read_query(request):
+    """The question in a sidebar request body; raises ValueError with a message for the user"""
+    data = json.loads(request.body)
+    query = data.get('query', '') if isinstance(data, dict) else None
+    if not isinstance(query, str):
+        raise ValueError('Expected a JSON object with a "query" string')
+    if not query.strip():
+        raise ValueError('Query cannot be empty')
+    return query
+
+
+def invalid_query(error):
+    return JsonResponse({
+        'success': False,
+        'error': str(error)
+    }, status=400)
+
+
 @login_required
 @require_POST
-def query_ai(request):
-    """Handle AI queries from the sidebar"""
+async def query_ai(request):
+    """Handle AI queries from the sidebar without holding a worker while the model answers"""
     try:
-        data = json.loads(request.body)
-        query = data.get('query', '')
-
-        if not query.strip():
-            return JsonResponse({
-                'success': False,
-                'error': 'Query cannot be empty'
-            })
+        query = read_query(request)
+    except ValueError as e:
+        return invalid_query(e)
 
+    try:
         # Get response from AI service
-        result = ai_service.query_ai(query, request.user)
+        user = await request.auser()
+        result = await ai_service.query_ai_async(query, user)
 
-        return JsonResponse(result)
+        status = 503 if result.get('busy') else 504 if result.get('timeout') else 200
+        return JsonResponse(result, status=status)
     except Exception as e:
         return JsonResponse({
             'success': False,
             'error': str(e)
         })
+
+
+def sse_event(data, event=None):
+    """Format one server-sent event"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def stream_events(query, user):
+    async for data in ai_service.stream_ai_async(query, user):
+        yield sse_event(data, event=None if 'text' in data else 'error')
+    yield sse_event({}, event='done')
+
+
+@login_required
+@require_POST
+async def query_ai_stream(request):
+    """Stream the answer to a sidebar query as server-sent events while the model generates it"""
+    try:
+        query = read_query(request)
+    except ValueError as e:
+        return invalid_query(e)
+
+    user = await request.auser()
+    response = StreamingHttpResponse(stream_events(query, user), content_type='text/event-stream')
+    # Keep caches and proxies (e.g. nginx) from holding chunks back
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
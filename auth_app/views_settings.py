@@ -36,8 +36,8 @@ def settings_profile(request):
 @login_required
 def settings_appearance(request):
     """View for appearance settings"""
-    # Get or create user preference
-    preference, created = UserPreference.objects.get_or_create(user=request.user)
+    # Get user preference (cached, see products.middleware.ThemeMiddleware)
+    preference = request.preferences
     
     context = {
         'preference': preference,
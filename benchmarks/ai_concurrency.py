@@ -0,0 +1,54 @@
+"""Compare blocking and async AI assistant calls using the simulated model.
+
+Runs N questions against AIService with AI_SIMULATE on and a fixed fake model
+latency, once one after another through the blocking query_ai (what a single
+WSGI worker does) and once concurrently through query_ai_async:
+
+    python benchmarks/ai_concurrency.py --questions 20 --latency 2
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import django
+
+# Set up Django environment
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invent.settings')
+django.setup()
+
+from django.conf import settings
+
+from ai_assistant.services import ai_service
+
+
+async def ask_concurrently(questions):
+    return await asyncio.gather(*[ai_service.query_ai_async(f'question {i}') for i in range(questions)])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=1.0, help="Simulated model latency in seconds")
+    args = parser.parse_args()
+
+    settings.AI_SIMULATE = True
+    settings.AI_SIMULATED_LATENCY = args.latency
+    settings.AI_QUEUE_TIMEOUT = args.questions * args.latency
+
+    start = time.perf_counter()
+    for i in range(args.questions):
+        ai_service.query_ai(f'question {i}')
+    print(f"blocking, one worker:  {time.perf_counter() - start:6.2f} s for {args.questions} questions")
+
+    start = time.perf_counter()
+    results = asyncio.run(ask_concurrently(args.questions))
+    answered = sum(1 for result in results if result['success'])
+    print(f"async, one process:    {time.perf_counter() - start:6.2f} s for {args.questions} questions "
+          f"({answered} answered, at most {settings.AI_MAX_CONCURRENT_REQUESTS} at a time)")
+
+
+if __name__ == '__main__':
+    main()
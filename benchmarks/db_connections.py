@@ -0,0 +1,80 @@
+"""Measure per-request database overhead with and without connection reuse.
+
+Simulates requests (request_started, one query, request_finished) against the
+database configured through the DB_* environment variables, e.g. a local
+Postgres stand-in:
+
+    DB_HOST=localhost DB_SSLMODE=disable python benchmarks/db_connections.py --requests 200
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import django
+
+# Set up Django environment
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'invent.settings')
+django.setup()
+
+from django.core import signals
+from django.db import connection, connections
+
+
+def simulate_requests(count):
+    """Per-request wall time in milliseconds for `count` simulated requests"""
+    timings = []
+    for _ in range(count):
+        start = time.perf_counter()
+        signals.request_started.send(sender=None)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+            cursor.fetchone()
+        signals.request_finished.send(sender=None)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def configure(conn_max_age, pool=None):
+    """Close the default connection and change how the next one is reused"""
+    connections.close_all()
+    connection.settings_dict['CONN_MAX_AGE'] = conn_max_age
+    connection.settings_dict['OPTIONS'].pop('pool', None)
+    if pool:
+        connection.settings_dict['OPTIONS']['pool'] = pool
+
+
+def report(label, timings):
+    timings = sorted(timings)
+    print(f"{label:<28} mean {statistics.mean(timings):7.2f} ms   "
+          f"p50 {timings[len(timings) // 2]:7.2f} ms   p95 {timings[int(len(timings) * 0.95)]:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests against {connection.settings_dict['HOST'] or 'localhost'}")
+
+    configure(0)
+    report('new connection per request', simulate_requests(args.requests))
+
+    configure(60)
+    report('CONN_MAX_AGE=60', simulate_requests(args.requests))
+
+    try:
+        import psycopg_pool  # noqa: F401
+    except ImportError:
+        print("psycopg_pool not installed, skipping the pooled run")
+    else:
+        configure(0, pool={'min_size': 1, 'max_size': 4})
+        report('psycopg pool', simulate_requests(args.requests))
+
+    connections.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Measure how long Django takes to start, to catch slow imports creeping back in.
+
+Runs `python -X importtime manage.py check` a few times and reports the
+wall time plus the top-level modules that take longest to import:
+
+    python benchmarks/import_time.py --runs 5 --top 15
+
+With --max-ms the script exits with status 1 when the median import time is
+over budget, and --json writes the results to compare runs over time.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_importtime(output):
+    """{module: cumulative microseconds} of the modules imported at top level"""
+    modules = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Nested imports are indented below the module that triggered them
+        if not name[1:].startswith(' '):
+            modules[name.strip()] = int(cumulative_us)
+    return modules
+
+
+def run_check(command):
+    """Wall time in milliseconds and per-module import times of one `manage.py check`"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + command, cwd=PROJECT_DIR,
+                            capture_output=True, text=True)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if result.returncode:
+        sys.exit(f"{' '.join(command)} failed:\n{result.stderr[-2000:]}")
+    return elapsed_ms, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help="Number of slowest modules to list")
+    parser.add_argument('--max-ms', type=float, help="Fail if the median import time exceeds this")
+    parser.add_argument('--json', help="Write the results to this file")
+    args = parser.parse_args()
+
+    command = ['manage.py', 'check']
+    # The first run warms the bytecode and filesystem caches and is not counted
+    run_check(command)
+    runs = [run_check(command) for _ in range(args.runs)]
+
+    wall_ms = statistics.median(elapsed_ms for elapsed_ms, modules in runs)
+    import_ms = statistics.median(sum(modules.values()) / 1000 for elapsed_ms, modules in runs)
+    names = set().union(*(modules for elapsed_ms, modules in runs))
+    slowest = sorted(
+        ((statistics.median(modules.get(name, 0) for elapsed_ms, modules in runs) / 1000, name) for name in names),
+        reverse=True,
+    )[:args.top]
+
+    print(f"python -X importtime {' '.join(command)}, median of {args.runs} runs")
+    print(f"wall time    {wall_ms:8.1f} ms")
+    print(f"imports      {import_ms:8.1f} ms")
+    print("\nslowest top-level imports:")
+    for ms, name in slowest:
+        print(f"{ms:8.1f} ms  {name}")
+
+    if args.json:
+        with open(args.json, 'w') as report_file:
+            json.dump({
+                'wall_ms': round(wall_ms, 1),
+                'import_ms': round(import_ms, 1),
+                'slowest': [{'module': name, 'ms': round(ms, 1)} for ms, name in slowest],
+            }, report_file, indent=2)
+
+    if args.max_ms is not None and import_ms > args.max_ms:
+        sys.exit(f"imports took {import_ms:.0f} ms, over the {args.max_ms:.0f} ms budget")
+
+
+if __name__ == '__main__':
+    main()
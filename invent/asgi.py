@@ -12,5 +12,8 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "invent.settings")
+# Sync code runs in a different thread for each ASGI request, so connections kept open
+# for reuse would pile up instead of being reused; use DB_POOL=1 to reuse them
+os.environ.setdefault("DB_CONN_MAX_AGE", "0")
 
 application = get_asgi_application()
@@ -0,0 +1,63 @@
+import os
+import threading
+
+from django.conf import settings
+
+
+class LazyClient:
+    """Builds an SDK client on first use and shares it between threads.
+
+    The factory (and the SDK imports inside it) only runs when get() is first
+    called, so worker boots, management commands and tests that never talk to
+    the service don't pay for importing or initializing it.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.client = None
+
+    def get(self):
+        if self.client is None:
+            with self.lock:
+                if self.client is None:
+                    self.client = self.factory()
+        return self.client
+
+    def reset(self):
+        """Forget the client so the next get() builds a new one (e.g. after a key change)"""
+        with self.lock:
+            self.client = None
+
+
+def _load_environment():
+    from dotenv import load_dotenv
+
+    # Load environment variables from the .env file
+    load_dotenv()
+    return True
+
+
+def _gemini():
+    import google.generativeai as genai
+
+    genai.configure(api_key=gemini_api_key())
+    return genai
+
+
+def _supabase():
+    from supabase import create_client
+
+    return create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
+
+
+environment = LazyClient(_load_environment)
+# The configured google.generativeai module
+gemini = LazyClient(_gemini)
+# Supabase client used for sign-up, sign-in and sign-out
+supabase = LazyClient(_supabase)
+
+
+def gemini_api_key():
+    environment.get()
+    return os.environ.get('GOOGLE_GEMINI_API_KEY', 'your-gemini-api-key-here')
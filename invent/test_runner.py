@@ -0,0 +1,12 @@
+from django.test.runner import DiscoverRunner
+
+# Slow tests that seed large data volumes; they only run when asked for with --tag
+OPT_IN_TAGS = {'perf'}
+
+
+class TestRunner(DiscoverRunner):
+    """Test runner that leaves out the OPT_IN_TAGS tests unless they are selected with --tag"""
+
+    def __init__(self, *args, tags=None, exclude_tags=None, **kwargs):
+        exclude_tags = set(exclude_tags or ()) | (OPT_IN_TAGS - set(tags or ()))
+        super().__init__(*args, tags=tags, exclude_tags=exclude_tags, **kwargs)
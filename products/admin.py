@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.db.models import Count
 from django.utils.html import format_html
 from .models import Category, Product
 
@@ -6,11 +7,17 @@ from .models import Category, Product
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'description', 'product_count', 'created_at', 'user')
     list_filter = ('user',)
+    list_select_related = ('user',)
     search_fields = ('name', 'description')
 
+    def get_queryset(self, request):
+        # Count products in the changelist query instead of once per row
+        return super().get_queryset(request).annotate(product_count=Count('products'))
+
     def product_count(self, obj):
-        return obj.products.count()
+        return obj.product_count
     product_count.short_description = 'Number of Products'
+    product_count.admin_order_field = 'product_count'
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
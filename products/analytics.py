@@ -0,0 +1,118 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Sum, F, Q, Case, When, Value, DecimalField, IntegerField, DateField
+from django.db.models.functions import Coalesce, TruncDay, TruncWeek, TruncMonth
+
+from .models import Product, DailySalesRollup
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+# Supported ?granularity= values for time series and their truncation functions
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def product_performance_queryset(user, start_date=None, end_date=None):
+    """Quantity, revenue and margin for every product of a user in one grouped query"""
+    # Per-product rollup rows inside the requested window
+    rollup_filter = Q()
+    if start_date:
+        rollup_filter &= Q(sales_rollups__date__gte=start_date)
+    if end_date:
+        rollup_filter &= Q(sales_rollups__date__lte=end_date)
+
+    return Product.objects.filter(user=user).annotate(
+        total_quantity=Coalesce(
+            Sum('sales_rollups__quantity', filter=rollup_filter),
+            Value(0), output_field=IntegerField()),
+        total_revenue=Coalesce(
+            Sum('sales_rollups__revenue', filter=rollup_filter, output_field=MONEY),
+            Value(Decimal('0')), output_field=MONEY),
+        margin=Case(
+            When(cost__gt=0, then=(F('price') - F('cost')) * 100 / F('cost')),
+            default=Value(Decimal('0')), output_field=MONEY),
+    ).values('id', 'name', 'total_quantity', 'total_revenue', 'margin').order_by('-total_revenue', 'name')
+
+
+def get_product_performance(user, start_date=None, end_date=None, limit=None):
+    """Return chart-ready performance data sorted by revenue (descending), for at most `limit` products"""
+    products = []
+    quantities = []
+    revenues = []
+    margins = []
+
+    rows = product_performance_queryset(user, start_date, end_date)
+    if limit is not None:
+        rows = rows[:limit]
+    for row in rows:
+        products.append(row['name'])
+        quantities.append(row['total_quantity'])
+        revenues.append(float(row['total_revenue']))
+        margins.append(row['margin'])
+
+    return {
+        'products': products,
+        'quantities': quantities,
+        'revenues': revenues,
+        'margins': margins
+    }
+
+
+def get_lowest_revenue_products(user, count, start_date=None, end_date=None):
+    """(name, revenue) of the `count` products with the lowest revenue, lowest first"""
+    rows = product_performance_queryset(user, start_date, end_date).order_by('total_revenue', 'name')[:count]
+    return [(row['name'], float(row['total_revenue'])) for row in rows]
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket that contains `day`"""
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    """First day of the bucket following the one starting at `day`"""
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    if granularity == 'month':
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + timedelta(days=1)
+
+
+def sales_time_series(user, start_date, end_date, granularity='day'):
+    """Sale totals bucketed by day, week or month from the daily rollup, with empty buckets filled"""
+    if granularity not in GRANULARITIES:
+        granularity = 'day'
+    trunc = GRANULARITIES[granularity]
+
+    # Read the per-day totals rows of the rollup table: one row per day, never one per sale
+    totals = DailySalesRollup.objects.filter(
+        user=user,
+        product__isnull=True,
+        category__isnull=True,
+        date__gte=start_date,
+        date__lte=end_date
+    ).annotate(
+        bucket=trunc('date', output_field=DateField())
+    ).values('bucket').annotate(total=Sum('revenue')).order_by('bucket')
+    sales_by_bucket = {row['bucket']: row['total'] for row in totals}
+
+    dates = []
+    amounts = []
+    current = bucket_start(start_date, granularity)
+    while current <= end_date:
+        dates.append(current.strftime('%Y-%m-%d'))
+        amounts.append(float(sales_by_bucket.get(current) or 0))
+        current = next_bucket(current, granularity)
+
+    return {
+        'dates': dates,
+        'amounts': amounts
+    }
@@ -0,0 +1,59 @@
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Namespace of the analytics pages, invalidated when sales, rollups, snapshots or products change
+ANALYTICS_CACHE = 'analytics'
+
+
+def _global_version_key(namespace):
+    return f'products:cache:{namespace}:version'
+
+
+def _user_version_key(namespace, user_id):
+    return f'products:cache:{namespace}:version:{user_id}'
+
+
+def namespace_versions(namespace, user_id):
+    """Current (global, per-user) versions of a cache namespace"""
+    keys = [_global_version_key(namespace), _user_version_key(namespace, user_id)]
+    versions = cache.get_many(keys)
+    return versions.get(keys[0], 1), versions.get(keys[1], 1)
+
+
+def bump_namespace(namespace, user_id=None):
+    """Invalidate a namespace for one user, or for everyone when user_id is None"""
+    key = _global_version_key(namespace) if user_id is None else _user_version_key(namespace, user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 2, None)
+
+
+def user_cache_key(namespace, user_id, *parts):
+    """Versioned cache key scoped to one user; `parts` identify the cached value within the namespace"""
+    global_version, user_version = namespace_versions(namespace, user_id)
+    digest = hashlib.md5(repr(parts).encode()).hexdigest()
+    return f'products:cache:{namespace}:{user_id}:{global_version}.{user_version}:{digest}'
+
+
+def default_timeout():
+    return getattr(settings, 'VIEW_CACHE_TIMEOUT', 300)
+
+
+def cached_per_user(namespace, timeout=None):
+    """Cache the result of a function whose first argument is a user, per user and arguments"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(user, *args, **kwargs):
+            key = user_cache_key(namespace, user.pk, func.__qualname__, args, sorted(kwargs.items()))
+            result = cache.get(key)
+            if result is None:
+                result = func(user, *args, **kwargs)
+                cache.set(key, result, default_timeout() if timeout is None else timeout)
+            return result
+        return wrapper
+    return decorator
+
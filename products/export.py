@@ -1,105 +1,132 @@
 import csv
 import io
 import datetime
-from django.http import HttpResponse
+import tempfile
+from django.db.models import Count, Max, CharField
+from django.db.models.functions import Cast, Length
+from django.http import HttpResponse, StreamingHttpResponse, FileResponse
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import letter, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 import openpyxl
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Font, Alignment, PatternFill
 from openpyxl.utils import get_column_letter
 
+# Rows fetched from the database per round-trip when streaming exports
+EXPORT_CHUNK_SIZE = 2000
+
+# Excel files larger than this are spooled to disk instead of memory
+EXCEL_SPOOL_MAX_SIZE = 10 * 1024 * 1024
+
+EXCEL_HEADER_FONT = Font(bold=True, color="FFFFFF")
+EXCEL_HEADER_FILL = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+EXCEL_HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='center', wrap_text=True)
+
+PRODUCT_EXPORT_FIELDS = ['name', 'sku', 'category__name', 'price', 'cost', 'quantity',
+                         'minimum_stock', 'status', 'supplier', 'created_at']
+
+class Echo:
+    """File-like object whose write() hands the value back, for use with csv.writer"""
+    def write(self, value):
+        return value
+
+def stream_csv(header, rows, rows_per_chunk=500):
+    """Yield CSV text a few hundred rows at a time"""
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow(row))
+        if len(chunk) >= rows_per_chunk:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
 def export_products_csv(queryset):
-    """Export products to CSV format"""
-    response = HttpResponse(content_type='text/csv')
+    """Export products to CSV format (streamed, constant memory)"""
+    # Plain tuples straight from the cursor: no model instances are built or cached
+    rows = (
+        (name, sku, category or '', price, cost, quantity, minimum_stock, status, supplier,
+         created_at.strftime('%Y-%m-%d %H:%M'))
+        for (name, sku, category, price, cost, quantity, minimum_stock, status, supplier, created_at)
+        in queryset.values_list(*PRODUCT_EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    response = StreamingHttpResponse(
+        stream_csv(['Name', 'SKU', 'Category', 'Price', 'Cost', 'Quantity',
+                    'Minimum Stock', 'Status', 'Supplier', 'Created At'], rows),
+        content_type='text/csv'
+    )
     response['Content-Disposition'] = 'attachment; filename="products_export_{}.csv"'.format(
         datetime.datetime.now().strftime('%Y-%m-%d')
     )
-    
-    writer = csv.writer(response)
-    # Write header row
-    writer.writerow(['Name', 'SKU', 'Category', 'Price', 'Cost', 'Quantity', 
-                    'Minimum Stock', 'Status', 'Supplier', 'Created At'])
-    
-    # Write data rows
-    for product in queryset:
-        writer.writerow([
-            product.name,
-            product.sku,
-            product.category.name if product.category else '',
-            product.price,
-            product.cost,
-            product.quantity,
-            product.minimum_stock,
-            product.status,
-            product.supplier,
-            product.created_at.strftime('%Y-%m-%d %H:%M')
-        ])
-    
     return response
 
+def max_lengths(queryset, fields):
+    """Longest rendered value of each field, computed by the database in one query"""
+    lengths = queryset.aggregate(**{
+        'len_{}'.format(index): Max(Length(Cast(field, output_field=CharField())))
+        for index, field in enumerate(fields)
+    })
+    return [lengths['len_{}'.format(index)] or 0 for index in range(len(fields))]
+
+def excel_response(filename, title, headers, rows, widths):
+    """Stream a write-only workbook to the client from a spooled temporary file"""
+    workbook = openpyxl.Workbook(write_only=True)
+    worksheet = workbook.create_sheet(title)
+
+    # Write-only sheets emit column widths before the first row, so set them up front
+    for col_num, (header, width) in enumerate(zip(headers, widths), 1):
+        worksheet.column_dimensions[get_column_letter(col_num)].width = max(len(header), width) + 2
+
+    # Header row (style objects are shared by every header cell)
+    header_row = []
+    for header in headers:
+        cell = WriteOnlyCell(worksheet, value=header)
+        cell.font = EXCEL_HEADER_FONT
+        cell.fill = EXCEL_HEADER_FILL
+        cell.alignment = EXCEL_HEADER_ALIGNMENT
+        header_row.append(cell)
+    worksheet.append(header_row)
+
+    for row in rows:
+        worksheet.append(row)
+
+    # Small files stay in memory, large ones roll over to disk
+    output = tempfile.SpooledTemporaryFile(max_size=EXCEL_SPOOL_MAX_SIZE)
+    workbook.save(output)
+    output.seek(0)
+
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    )
+
 def export_products_excel(queryset):
     """Export products to Excel format"""
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="products_export_{}.xlsx"'.format(
-        datetime.datetime.now().strftime('%Y-%m-%d')
+    headers = ['Name', 'SKU', 'Category', 'Price', 'Cost', 'Quantity',
+               'Minimum Stock', 'Status', 'Supplier', 'Created At']
+
+    # Column widths from the database; created_at is always rendered as 16 characters
+    widths = max_lengths(queryset, PRODUCT_EXPORT_FIELDS[:-1]) + [16]
+
+    rows = (
+        (name, sku, category or '', float(price), float(cost) if cost else 0, quantity, minimum_stock,
+         status, supplier, created_at.strftime('%Y-%m-%d %H:%M'))
+        for (name, sku, category, price, cost, quantity, minimum_stock, status, supplier, created_at)
+        in queryset.values_list(*PRODUCT_EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+    return excel_response(
+        'products_export_{}.xlsx'.format(datetime.datetime.now().strftime('%Y-%m-%d')),
+        'Products', headers, rows, widths
     )
-    
-    # Create a workbook and add a worksheet
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Products"
-    
-    # Define styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    
-    # Write header row
-    headers = ['Name', 'SKU', 'Category', 'Price', 'Cost', 'Quantity', 
-              'Minimum Stock', 'Status', 'Supplier', 'Created At']
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = worksheet.cell(row=1, column=col_num)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-    
-    # Write data rows
-    for row_num, product in enumerate(queryset, 2):
-        worksheet.cell(row=row_num, column=1).value = product.name
-        worksheet.cell(row=row_num, column=2).value = product.sku
-        worksheet.cell(row=row_num, column=3).value = product.category.name if product.category else ''
-        worksheet.cell(row=row_num, column=4).value = float(product.price)
-        worksheet.cell(row=row_num, column=5).value = float(product.cost) if product.cost else 0
-        worksheet.cell(row=row_num, column=6).value = product.quantity
-        worksheet.cell(row=row_num, column=7).value = product.minimum_stock
-        worksheet.cell(row=row_num, column=8).value = product.status
-        worksheet.cell(row=row_num, column=9).value = product.supplier
-        worksheet.cell(row=row_num, column=10).value = product.created_at.strftime('%Y-%m-%d %H:%M')
-    
-    # Auto-adjust column widths
-    for column in worksheet.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        worksheet.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to response
-    buffer = io.BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-    response.write(buffer.getvalue())
-    
-    return response
 
 def export_products_pdf(queryset):
     """Export products to PDF format"""
@@ -173,82 +200,43 @@ def export_products_pdf(queryset):
     
     return response
 
+CATEGORY_EXPORT_HEADERS = ['Name', 'Description', 'Product Count', 'Created At']
+
+def with_product_counts(queryset):
+    """Annotate product_count unless the queryset already carries the annotation"""
+    if 'product_count' not in queryset.query.annotations:
+        queryset = queryset.annotate(product_count=Count('products'))
+    return queryset
+
+def category_export_rows(queryset, date_format='%Y-%m-%d %H:%M'):
+    """(name, description, product count, created at) rows for every category, in a single query"""
+    rows = with_product_counts(queryset).values_list(
+        'name', 'description', 'product_count', 'created_at').iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    for name, description, product_count, created_at in rows:
+        yield name, description or '', product_count, created_at.strftime(date_format)
+
 def export_categories_csv(queryset):
-    """Export categories to CSV format"""
-    response = HttpResponse(content_type='text/csv')
+    """Export categories to CSV format (streamed, constant memory)"""
+    response = StreamingHttpResponse(
+        stream_csv(CATEGORY_EXPORT_HEADERS, category_export_rows(queryset)),
+        content_type='text/csv'
+    )
     response['Content-Disposition'] = 'attachment; filename="categories_export_{}.csv"'.format(
         datetime.datetime.now().strftime('%Y-%m-%d')
     )
-    
-    writer = csv.writer(response)
-    # Write header row
-    writer.writerow(['Name', 'Description', 'Product Count', 'Created At'])
-    
-    # Write data rows
-    for category in queryset:
-        writer.writerow([
-            category.name,
-            category.description or '',
-            category.products.count(),
-            category.created_at.strftime('%Y-%m-%d %H:%M')
-        ])
-    
     return response
 
 def export_categories_excel(queryset):
     """Export categories to Excel format"""
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="categories_export_{}.xlsx"'.format(
-        datetime.datetime.now().strftime('%Y-%m-%d')
+    queryset = with_product_counts(queryset)
+
+    # product_count is an aggregate and cannot be measured again; its header is wider anyway
+    widths = max_lengths(queryset, ['name', 'description']) + [0, 16]
+
+    return excel_response(
+        'categories_export_{}.xlsx'.format(datetime.datetime.now().strftime('%Y-%m-%d')),
+        'Categories', CATEGORY_EXPORT_HEADERS, category_export_rows(queryset), widths
     )
-    
-    # Create a workbook and add a worksheet
-    workbook = openpyxl.Workbook()
-    worksheet = workbook.active
-    worksheet.title = "Categories"
-    
-    # Define styles
-    header_font = Font(bold=True, color="FFFFFF")
-    header_fill = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-    header_alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-    
-    # Write header row
-    headers = ['Name', 'Description', 'Product Count', 'Created At']
-    
-    for col_num, header in enumerate(headers, 1):
-        cell = worksheet.cell(row=1, column=col_num)
-        cell.value = header
-        cell.font = header_font
-        cell.fill = header_fill
-        cell.alignment = header_alignment
-    
-    # Write data rows
-    for row_num, category in enumerate(queryset, 2):
-        worksheet.cell(row=row_num, column=1).value = category.name
-        worksheet.cell(row=row_num, column=2).value = category.description or ''
-        worksheet.cell(row=row_num, column=3).value = category.products.count()
-        worksheet.cell(row=row_num, column=4).value = category.created_at.strftime('%Y-%m-%d %H:%M')
-    
-    # Auto-adjust column widths
-    for column in worksheet.columns:
-        max_length = 0
-        column_letter = get_column_letter(column[0].column)
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        worksheet.column_dimensions[column_letter].width = adjusted_width
-    
-    # Save to response
-    buffer = io.BytesIO()
-    workbook.save(buffer)
-    buffer.seek(0)
-    response.write(buffer.getvalue())
-    
-    return response
 
 def export_categories_pdf(queryset):
     """Export categories to PDF format"""
@@ -270,15 +258,10 @@ def export_categories_pdf(queryset):
     elements.append(Spacer(1, 20))
     
     # Prepare data for table
-    data = [['Name', 'Description', 'Product Count', 'Created At']]
+    data = [CATEGORY_EXPORT_HEADERS]
     
-    for category in queryset:
-        data.append([
-            category.name,
-            category.description or '',
-            str(category.products.count()),
-            category.created_at.strftime('%Y-%m-%d')
-        ])
+    for name, description, product_count, created_at in category_export_rows(queryset, '%Y-%m-%d'):
+        data.append([name, description, str(product_count), created_at])
     
     # Create table
     table = Table(data)
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .models import Product, Category, ExportJob
+from .filters import filter_products
+from .export import (
+    export_products_csv, export_products_excel, export_products_pdf,
+    export_categories_csv, export_categories_excel, export_categories_pdf
+)
+
+EXPORT_FUNCTIONS = {
+    ('products', 'csv'): export_products_csv,
+    ('products', 'excel'): export_products_excel,
+    ('products', 'pdf'): export_products_pdf,
+    ('categories', 'csv'): export_categories_csv,
+    ('categories', 'excel'): export_categories_excel,
+    ('categories', 'pdf'): export_categories_pdf,
+}
+
+FILE_EXTENSIONS = {
+    'csv': 'csv',
+    'excel': 'xlsx',
+    'pdf': 'pdf',
+}
+
+
+def export_ttl():
+    """How long finished export files are kept for download"""
+    return timedelta(hours=getattr(settings, 'EXPORT_JOB_TTL_HOURS', 24))
+
+
+def export_timeout():
+    """How long a job may stay running before its worker is assumed dead"""
+    return timedelta(minutes=getattr(settings, 'EXPORT_JOB_TIMEOUT_MINUTES', 30))
+
+
+def export_queryset(user, target, filters):
+    """The queryset an export of `target` for `user` would contain"""
+    if target == 'products':
+        products = filter_products(Product.objects.filter(user=user), filters)
+        return products.select_related('category').order_by('name')
+    return Category.objects.filter(user=user).annotate(product_count=Count('products')).order_by('name')
+
+
+def export_data_version(user):
+    """Row counts and last change times of a user's products and categories.
+
+    Part of the fingerprint, so an edit, import, sale or deletion makes the
+    next request build a new file instead of reusing one with stale data.
+    """
+    version = []
+    for model in (Product, Category):
+        totals = model.objects.filter(user=user).aggregate(count=Count('id'), changed=Max('updated_at'))
+        version += [totals['count'], totals['changed'] and totals['changed'].isoformat()]
+    return version
+
+
+def export_fingerprint(user, target, export_format, filters, data_version=None):
+    """Stable hash identifying an export request, used to deduplicate jobs"""
+    payload = json.dumps({
+        'user': user.pk,
+        'target': target,
+        'format': export_format,
+        'filters': filters,
+        'data_version': data_version,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def request_export(user, target, export_format, filters=None):
+    """Queue an export job, or return an identical one over unchanged data that is queued, running or downloadable"""
+    filters = filters or {}
+    fingerprint = export_fingerprint(user, target, export_format, filters, export_data_version(user))
+
+    now = timezone.now()
+    existing = ExportJob.objects.filter(user=user, fingerprint=fingerprint).filter(
+        Q(status='pending') |
+        Q(status='running', started_at__gt=now - export_timeout()) |
+        Q(status='completed', expires_at__gt=now)
+    ).first()
+    if existing:
+        return existing
+
+    return ExportJob.objects.create(
+        user=user,
+        target=target,
+        export_format=export_format,
+        filters=filters,
+        fingerprint=fingerprint,
+    )
+
+
+def claim_job(job_id):
+    """Atomically move a pending job to running; False if another worker got it first"""
+    return ExportJob.objects.filter(pk=job_id, status='pending').update(
+        status='running', progress=0, started_at=timezone.now()) == 1
+
+
+def set_progress(job, progress):
+    job.progress = progress
+    ExportJob.objects.filter(pk=job.pk).update(progress=progress)
+
+
+def run_export_job(job_id):
+    """Run one pending export job with the regular export_* functions and store the artifact"""
+    if not claim_job(job_id):
+        return None
+
+    job = ExportJob.objects.select_related('user').get(pk=job_id)
+    try:
+        queryset = export_queryset(job.user, job.target, job.filters)
+        set_progress(job, 10)
+
+        response = EXPORT_FUNCTIONS[(job.target, job.export_format)](queryset)
+        set_progress(job, 50)
+
+        # Copy the (possibly streamed) response body into a temporary file, then into storage
+        with tempfile.TemporaryFile() as output:
+            chunks = response.streaming_content if response.streaming else [response.content]
+            for chunk in chunks:
+                output.write(chunk)
+            response.close()
+            set_progress(job, 90)
+
+            filename = '{}_export_{}.{}'.format(
+                job.target, timezone.now().strftime('%Y-%m-%d'), FILE_EXTENSIONS[job.export_format])
+            job.file.save(filename, File(output), save=False)
+
+        job.status = 'completed'
+        job.progress = 100
+        job.finished_at = timezone.now()
+        job.expires_at = job.finished_at + export_ttl()
+        job.save(update_fields=['file', 'status', 'progress', 'finished_at', 'expires_at'])
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+    return job
+
+
+def fail_stale_exports():
+    """Mark jobs running for longer than the timeout (their worker died) as failed"""
+    now = timezone.now()
+    return ExportJob.objects.filter(status='running', started_at__lte=now - export_timeout()).update(
+        status='failed', error='The export timed out.', finished_at=now)
+
+
+def purge_expired_exports():
+    """Delete expired export files and their jobs, and failed jobs older than the TTL; returns the number removed"""
+    now = timezone.now()
+    fail_stale_exports()
+    expired = ExportJob.objects.filter(
+        Q(expires_at__lte=now) |
+        Q(status='failed', created_at__lte=now - export_ttl())
+    )
+    count = 0
+    for job in expired.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        count += 1
+    return count
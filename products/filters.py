@@ -0,0 +1,35 @@
+from django.db.models import F
+
+from .search import search_products
+
+# product_list query parameters that narrow the product list (and its exports)
+PRODUCT_FILTER_PARAMS = ['search', 'category', 'status', 'low_stock']
+
+
+def product_filter_params(params):
+    """The non-empty product filter parameters of a request, as a plain dict"""
+    return {key: params.get(key) for key in PRODUCT_FILTER_PARAMS if params.get(key)}
+
+
+def filter_products(queryset, params):
+    """Apply the product_list search and filter parameters to a product queryset"""
+    # Search functionality (full-text/trigram on PostgreSQL); annotates search_rank
+    search_query = params.get('search')
+    if search_query:
+        queryset = search_products(queryset, search_query)
+
+    # Category filter
+    category_id = params.get('category')
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+
+    # Status filter
+    status = params.get('status')
+    if status:
+        queryset = queryset.filter(status=status)
+
+    # Low stock filter
+    if params.get('low_stock'):
+        queryset = queryset.filter(quantity__lte=F('minimum_stock'))
+
+    return queryset
@@ -17,4 +17,15 @@ class CategoryForm(forms.ModelForm):
         fields = ['name', 'description']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 3}),
-        }
\ No newline at end of file
+        }
+
+class ImportFileForm(forms.Form):
+    file = forms.FileField(help_text="CSV or Excel (.xlsx) file with a header row, e.g. a product export")
+    create_categories = forms.BooleanField(required=False, initial=True, label="Create missing categories")
+    dry_run = forms.BooleanField(required=False, label="Only validate the file, don't save anything")
+
+    def clean_file(self):
+        upload = self.cleaned_data['file']
+        if not upload.name.lower().endswith(('.csv', '.xlsx')):
+            raise forms.ValidationError("Please upload a .csv or .xlsx file.")
+        return upload
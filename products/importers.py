@@ -0,0 +1,268 @@
+import csv
+import io
+import os
+import zipfile
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import Product, Category
+from .forms import ProductForm
+from .widgets import invalidate_widgets
+from .caching import ANALYTICS_CACHE, bump_namespace
+
+IMPORT_BATCH_SIZE = 1000
+IMPORT_EXTENSIONS = ('.csv', '.xlsx')
+
+# Columns that can be imported; headers are matched case-insensitively, with spaces
+# treated as underscores, so files produced by the product exports can be re-imported
+IMPORT_COLUMNS = ProductForm.Meta.fields
+
+# Values used for columns a file leaves out when it creates a product
+IMPORT_DEFAULTS = {
+    'quantity': 0,
+    'minimum_stock': 0,
+    'maximum_stock': 0,
+    'status': 'active',
+}
+
+
+# ProductForm's field rules, reused for every row; categories come from a name map instead
+ROW_FIELDS = {name: field for name, field in ProductForm.base_fields.items() if name != 'category'}
+
+
+def validate_row(data, categories):
+    """Clean one row with ProductForm's field rules and Product.clean(); returns (product, errors)"""
+    cleaned = {}
+    errors = []
+    for name, field in ROW_FIELDS.items():
+        try:
+            cleaned[name] = field.clean(data.get(name, ''))
+        except ValidationError as e:
+            errors.extend(f'{name}: {message}' for message in e.messages)
+
+    category_name = str(data.get('category', '')).strip()
+    category = categories.get(category_name.lower())
+    if not category_name:
+        errors.append('category: This field is required.')
+    elif category is None:
+        errors.append(f'category: Unknown category "{category_name}".')
+    if errors:
+        return None, errors
+
+    product = Product(category=category, **cleaned)
+    try:
+        product.clean()
+    except ValidationError as e:
+        return None, e.messages
+    return product, []
+
+
+class ImportResult:
+    """Counts and per-row errors of one import"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.errors = []
+
+    def add_error(self, row_number, messages):
+        self.errors.append((row_number, messages))
+
+    @property
+    def total(self):
+        return self.created + self.updated + len(self.errors)
+
+
+def normalize_header(header):
+    return str(header or '').strip().lower().replace(' ', '_')
+
+
+def _csv_rows(file):
+    reader = csv.reader(io.TextIOWrapper(file, encoding='utf-8-sig', newline=''))
+    try:
+        yield from reader
+    except csv.Error as e:
+        raise ValueError(f'The CSV file could not be read: {e}.') from e
+
+
+def _xlsx_value(value):
+    if value is None:
+        return ''
+    # Excel stores every number as a float; keep whole numbers (SKUs, quantities) integral
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def _xlsx_rows(file):
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    # Read-only workbooks stream rows from the file instead of building every cell
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as e:
+        raise ValueError('The file is not a valid Excel (.xlsx) workbook.') from e
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield [_xlsx_value(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def read_rows(file, filename):
+    """Yield (row_number, {column: value}) for each data row of a CSV or XLSX file.
+
+    Raises ValueError for unsupported, corrupt or unreadable files.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in IMPORT_EXTENSIONS:
+        raise ValueError(f'Unsupported file type "{extension}", expected CSV or XLSX.')
+
+    rows = _xlsx_rows(file) if extension == '.xlsx' else _csv_rows(file)
+    header = [normalize_header(column) for column in next(rows, [])]
+    if 'sku' not in header:
+        raise ValueError('The file needs at least a "SKU" column.')
+
+    columns = [(index, column) for index, column in enumerate(header) if column in IMPORT_COLUMNS]
+    for row_number, row in enumerate(rows, start=2):
+        if not any(str(value).strip() for value in row):
+            continue
+        yield row_number, {column: row[index] if index < len(row) else '' for index, column in columns}
+
+
+def load_categories(user):
+    """Lowercased name -> Category map of a user's categories"""
+    return {category.name.lower(): category for category in Category.objects.filter(user=user)}
+
+
+def create_missing_categories(user, rows, categories, dry_run=False):
+    """Create the categories named in `rows` that do not exist yet, in one query"""
+    names = {}
+    for row_number, row in rows:
+        name = str(row.get('category', '')).strip()
+        if name and name.lower() not in categories:
+            names.setdefault(name.lower(), name)
+    if names:
+        created = [Category(user=user, name=name) for name in names.values()]
+        if not dry_run:
+            Category.objects.bulk_create(created)
+        categories.update((category.name.lower(), category) for category in created)
+
+
+def insert_products(rows, result):
+    """Insert new products in one query; returns how many were created.
+
+    If another import took one of the SKUs since the lookup, the batch is
+    retried row by row and the clashing rows are reported as errors.
+    """
+    try:
+        with transaction.atomic():
+            Product.objects.bulk_create([product for row_number, product in rows])
+        return len(rows)
+    except IntegrityError:
+        pass
+
+    created = 0
+    for row_number, product in rows:
+        try:
+            with transaction.atomic():
+                Product.objects.bulk_create([product])
+        except IntegrityError:
+            result.add_error(row_number, [f'SKU "{product.sku}" was added by another import meanwhile.'])
+        else:
+            created += 1
+    return created
+
+
+def import_batch(user, rows, categories, columns, seen_skus, result, dry_run=False):
+    """Validate one batch of rows, update the user's existing SKUs and insert the new ones"""
+    skus = [str(row['sku']).strip() for row_number, row in rows]
+    existing = {
+        product['sku']: product
+        for product in Product.objects.filter(sku__in=skus).values('id', 'user_id', 'category__name', *IMPORT_COLUMNS)
+    }
+
+    new_products = []
+    updated_products = []
+    now = timezone.now()
+    for row_number, row in rows:
+        sku = str(row['sku']).strip()
+        current = existing.get(sku)
+        if current and current['user_id'] != user.pk:
+            result.add_error(row_number, [f'SKU "{sku}" belongs to another account.'])
+            continue
+        if sku in seen_skus:
+            result.add_error(row_number, [f'SKU "{sku}" already appears on row {seen_skus[sku]}.'])
+            continue
+
+        # Columns missing from the file keep the stored value (or the default for new products)
+        if current:
+            data = {column: current[column] for column in IMPORT_COLUMNS if column != 'category'}
+            data['category'] = current['category__name']
+        else:
+            data = dict(IMPORT_DEFAULTS)
+        data.update((column, '' if value is None else value) for column, value in row.items())
+        data['sku'] = sku
+
+        product, errors = validate_row(data, categories)
+        if errors:
+            result.add_error(row_number, errors)
+            continue
+
+        seen_skus[sku] = row_number
+        product.user = user
+        if current:
+            # Updates go to the user's own row by id, never to whoever owns the SKU at write time
+            product.pk = current['id']
+            product.updated_at = now
+            updated_products.append(product)
+        else:
+            new_products.append((row_number, product))
+
+    created = len(new_products)
+    if not dry_run:
+        if updated_products:
+            update_fields = [column for column in IMPORT_COLUMNS if column in columns and column != 'sku']
+            Product.objects.bulk_update(updated_products, update_fields + ['updated_at'])
+        if new_products:
+            created = insert_products(new_products, result)
+    result.updated += len(updated_products)
+    result.created += created
+
+
+def import_products(user, file, filename, batch_size=IMPORT_BATCH_SIZE, create_categories=True,
+                    dry_run=False, progress=None):
+    """Import products from a CSV or XLSX file, creating new SKUs and updating the user's existing ones.
+
+    Invalid rows are skipped and reported in the returned ImportResult; every
+    valid row is saved. Raises ValueError if the file itself cannot be read.
+    """
+    result = ImportResult()
+    categories = load_categories(user)
+    seen_skus = {}
+    rows = read_rows(file, filename)
+
+    columns = None
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            break
+        if columns is None:
+            columns = set(batch[0][1])
+
+        with transaction.atomic():
+            if create_categories:
+                create_missing_categories(user, batch, categories, dry_run)
+            import_batch(user, batch, categories, columns, seen_skus, result, dry_run)
+        if progress:
+            progress(result)
+
+    # bulk_create sends no signals, so drop the caches the product signals would have
+    if not dry_run and result.created + result.updated:
+        invalidate_widgets(user.pk)
+        bump_namespace(ANALYTICS_CACHE, user.pk)
+    return result
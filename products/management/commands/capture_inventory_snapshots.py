@@ -0,0 +1,46 @@
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from products.models import InventorySnapshot
+from products.snapshots import capture_snapshots
+
+
+class Command(BaseCommand):
+    help = "Record today's inventory value for every user (safe to re-run; schedule it daily)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help="Capture this day (YYYY-MM-DD) instead of today")
+        parser.add_argument('--backfill', type=int, default=0,
+                            help="Also capture the N days before --date, oldest first")
+        parser.add_argument('--missing-only', action='store_true',
+                            help="Skip users that already have a snapshot for the day (resume an interrupted run)")
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help="Number of users written per upsert batch")
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                end_date = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError("--date must be in YYYY-MM-DD format")
+        else:
+            end_date = timezone.localdate()
+
+        batch_size = options['batch_size']
+        total = 0
+        for offset in range(options['backfill'], -1, -1):
+            day = end_date - timedelta(days=offset)
+
+            user_ids = None
+            if options['missing_only']:
+                done = InventorySnapshot.objects.filter(date=day).values('user_id')
+                user_ids = User.objects.exclude(id__in=done).values('id')
+
+            count = capture_snapshots(day, user_ids, batch_size=batch_size)
+            total += count
+            self.stdout.write(f"{day}: {count} snapshot(s)")
+
+        self.stdout.write(self.style.SUCCESS(f"Captured {total} inventory snapshot(s)."))
@@ -0,0 +1,56 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from products.importers import import_products, IMPORT_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Create or update a user's products from a CSV or Excel (.xlsx) file, upserting on SKU"
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help="Path of the .csv or .xlsx file")
+        parser.add_argument('--user', required=True, help="Username (or id) owning the imported products")
+        parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+                            help="Rows validated and written per batch")
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help="Reject rows whose category does not exist instead of creating it")
+        parser.add_argument('--dry-run', action='store_true', help="Validate the file without saving anything")
+        parser.add_argument('--errors', help="Write rejected rows and their errors to this CSV file")
+
+    def handle(self, *args, **options):
+        lookup = {'pk': options['user']} if options['user'].isdigit() else {'username': options['user']}
+        try:
+            user = User.objects.get(**lookup)
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['user']} does not exist")
+
+        def progress(result):
+            self.stdout.write(f"{result.total} rows processed...")
+
+        try:
+            with open(options['file'], 'rb') as file:
+                result = import_products(
+                    user, file, options['file'],
+                    batch_size=options['batch_size'],
+                    create_categories=not options['no_create_categories'],
+                    dry_run=options['dry_run'],
+                    progress=progress,
+                )
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        for row_number, messages in result.errors:
+            self.stderr.write(f"Row {row_number}: {'; '.join(messages)}")
+        if options['errors']:
+            with open(options['errors'], 'w', newline='') as errors_file:
+                writer = csv.writer(errors_file)
+                writer.writerow(['Row', 'Errors'])
+                writer.writerows((row_number, '; '.join(messages)) for row_number, messages in result.errors)
+
+        summary = f"{result.created} created, {result.updated} updated, {len(result.errors)} rejected."
+        if options['dry_run']:
+            self.stdout.write(f"Dry run, nothing saved: {summary}")
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
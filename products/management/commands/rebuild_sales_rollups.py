@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.rollups import rebuild_rollups, refresh_daily_rollup, find_drift
+
+
+class Command(BaseCommand):
+    help = "Backfill or reconcile the DailySalesRollup table from raw sales"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only process this user id")
+        parser.add_argument('--days', type=int, help="Only process the last N days (default: all history)")
+        parser.add_argument('--reconcile', action='store_true',
+                            help="Only rebuild days whose stored totals drifted from the raw sales")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="With --reconcile, report drifted days without fixing them")
+
+    def handle(self, *args, **options):
+        user_id = options['user']
+        start_date = None
+        end_date = None
+        if options['days']:
+            end_date = timezone.localdate()
+            start_date = end_date - timedelta(days=options['days'])
+
+        if not options['reconcile']:
+            count = rebuild_rollups(user_id, start_date, end_date)
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} rollup rows."))
+            return
+
+        drifted = find_drift(user_id, start_date, end_date)
+        for drift_user_id, day in drifted:
+            self.stdout.write(f"Drift: user {drift_user_id} on {day}")
+            if not options['dry_run']:
+                refresh_daily_rollup(drift_user_id, day)
+
+        if options['dry_run']:
+            self.stdout.write(f"{len(drifted)} day(s) out of date.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Reconciled {len(drifted)} day(s)."))
@@ -0,0 +1,45 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from products.models import ExportJob
+from products.export_jobs import run_export_job, purge_expired_exports
+
+
+def _run_in_thread(job_id):
+    try:
+        return run_export_job(job_id)
+    finally:
+        # Each worker thread has its own database connection
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = "Process queued export jobs with a local thread pool and purge expired export files"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help="Number of exports to run in parallel")
+        parser.add_argument('--poll-interval', type=float, default=2.0,
+                            help="Seconds to wait between checks for new jobs")
+        parser.add_argument('--once', action='store_true', help="Process the current queue and exit")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            while True:
+                purged = purge_expired_exports()
+                if purged:
+                    self.stdout.write(f"Purged {purged} expired export(s).")
+
+                job_ids = list(ExportJob.objects.filter(status='pending').order_by('created_at')
+                               .values_list('id', flat=True)[:workers * 4])
+                for job in pool.map(_run_in_thread, job_ids):
+                    if job is not None:
+                        self.stdout.write(f"{job}: {job.status}")
+
+                if options['once'] and not job_ids:
+                    break
+                if not job_ids:
+                    time.sleep(options['poll_interval'])
@@ -1,22 +1,159 @@
-from .models import UserPreference
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.utils.functional import SimpleLazyObject
+
+from .preferences import get_preferences
+
+logger = logging.getLogger('products.performance')
 
 class ThemeMiddleware:
+    # Async-capable so async views (the AI assistant) aren't moved onto a worker thread
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        # Set default theme
-        request.theme = 'light'
-        
-        # Check if user is authenticated
+        # Preferences are loaded at most once per request, and only if something reads them
+        request.preferences = SimpleLazyObject(lambda: self.get_preferences(request))
+        request.theme = SimpleLazyObject(lambda: self.get_theme(request))
+        return self.get_response(request)
+
+    def get_preferences(self, request):
         if request.user.is_authenticated:
-            # Try to get user preference
-            try:
-                preference = UserPreference.objects.get(user=request.user)
-                request.theme = preference.theme
-            except UserPreference.DoesNotExist:
-                # Create default preference for user
-                UserPreference.objects.create(user=request.user, theme='light')
-        
-        response = self.get_response(request)
+            return get_preferences(request.user)
+        return None
+
+    def get_theme(self, request):
+        # Default theme for anonymous users
+        if request.preferences:
+            return request.preferences.theme
+        return 'light'
+
+
+class QueryStats:
+    """execute_wrapper that counts and times every query of a request"""
+
+    def __init__(self, slow_query_ms):
+        self.slow_query_ms = slow_query_ms
+        self.count = 0
+        self.duration_ms = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.duration_ms += duration_ms
+            self.statements[sql] += 1
+            if duration_ms >= self.slow_query_ms:
+                logger.warning('Slow query (%.1f ms) on %s: %s', duration_ms, context['connection'].alias, sql)
+
+
+# Stats of the request being handled; copied into the threads async views run ORM code in
+request_query_stats = ContextVar('request_query_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    """Connection-wide execute_wrapper feeding the current request's QueryStats, if any"""
+    stats = request_query_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class QueryInstrumentationMiddleware:
+    """Record query count, DB time and view time per request, without needing DEBUG.
+
+    The timings are added as a Server-Timing header; slow requests and
+    requests repeating the same SQL (likely N+1s) are logged. Queries run
+    while a streaming response is iterated are not included.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, 'QUERY_INSTRUMENTATION_SAMPLE_RATE', 1.0)
+        self.slow_query_ms = getattr(settings, 'SLOW_QUERY_MS', 100)
+        self.slow_request_ms = getattr(settings, 'SLOW_REQUEST_MS', 500)
+        self.repeated_query_threshold = getattr(settings, 'REPEATED_QUERY_THRESHOLD', 10)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        for conn in connections.all():
+            install_query_recorder(conn)
+        stats = QueryStats(self.slow_query_ms)
+        token = request_query_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_query_stats.reset(token)
+        return self.finish(request, response, stats, (time.perf_counter() - start) * 1000)
+
+    async def __acall__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return await self.get_response(request)
+
+        # ORM code runs in worker threads here; their connections get the
+        # recorder from the connection_created signal (see products.signals)
+        stats = QueryStats(self.slow_query_ms)
+        token = request_query_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_query_stats.reset(token)
+        return self.finish(request, response, stats, (time.perf_counter() - start) * 1000)
+
+    def finish(self, request, response, stats, total_ms):
+        response['Server-Timing'] = 'db;dur={:.1f};desc="{} queries", view;dur={:.1f}'.format(
+            stats.duration_ms, stats.count, total_ms - stats.duration_ms)
+        self.log(request, response, stats, total_ms)
         return response
+
+    def log(self, request, response, stats, total_ms):
+        sql, repeats = stats.statements.most_common(1)[0] if stats.statements else ('', 0)
+        fields = {
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'queries': stats.count,
+            'db_ms': round(stats.duration_ms, 1),
+            'total_ms': round(total_ms, 1),
+        }
+        message = ' '.join(f'{key}={value}' for key, value in fields.items())
+
+        if repeats > self.repeated_query_threshold:
+            logger.warning('%s repeated_query=%d sql=%r', message, repeats, sql, extra=fields)
+        elif total_ms >= self.slow_request_ms:
+            logger.warning('%s slow_request', message, extra=fields)
+        else:
+            logger.info(message, extra=fields)
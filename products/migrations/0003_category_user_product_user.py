@@ -6,13 +6,12 @@ import django.db.models.deletion
 
 
 def column_exists(table, column):
+    # Use Django's introspection so this also works on SQLite test databases
     with connection.cursor() as cursor:
-        cursor.execute(
-            """SELECT column_name FROM information_schema.columns
-               WHERE table_name = %s AND column_name = %s""",
-            [table, column]
+        return any(
+            col.name == column
+            for col in connection.introspection.get_table_description(cursor, table)
         )
-        return bool(cursor.fetchone())
 
 
 def add_user_field_if_not_exists(apps, schema_editor):
@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 03:16
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_exportjob"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["user", "name", "id"], name="products_pr_user_id_3fa984_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["user", "category"], name="products_pr_user_id_9b53d5_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["user", "status"], name="products_pr_user_id_fb8a85_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["user", "quantity", "minimum_stock"],
+                name="products_pr_user_id_0aebfc_idx",
+            ),
+        ),
+    ]
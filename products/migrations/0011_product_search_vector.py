@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-18 03:17
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Weighted document: name and SKU rank above the description
+SEARCH_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION products_product_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.name, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.sku, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product;
+CREATE TRIGGER products_product_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF name, sku, description ON products_product
+    FOR EACH ROW EXECUTE FUNCTION products_product_search_vector_update();
+"""
+
+
+def create_search_support(apps, schema_editor):
+    # Full-text/trigram search is PostgreSQL only; other databases use SimpleSearchBackend
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm;")
+    schema_editor.execute(SEARCH_TRIGGER_SQL)
+    # Touch every row once so the trigger fills search_vector for existing products
+    schema_editor.execute("UPDATE products_product SET name = name;")
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_search_vector_idx "
+        "ON products_product USING gin (search_vector);"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_name_trgm_idx "
+        "ON products_product USING gin (name gin_trgm_ops);"
+    )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_sku_trgm_idx "
+        "ON products_product USING gin (sku gin_trgm_ops);"
+    )
+
+
+def drop_search_support(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_sku_trgm_idx;")
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_name_trgm_idx;")
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_search_vector_idx;")
+    schema_editor.execute(
+        "DROP TRIGGER IF EXISTS products_product_search_vector_trigger ON products_product;"
+    )
+    schema_editor.execute("DROP FUNCTION IF EXISTS products_product_search_vector_update();")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_product_user_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunPython(create_search_support, drop_search_support),
+    ]
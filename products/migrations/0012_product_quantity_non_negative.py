@@ -0,0 +1,30 @@
+# Generated by Django 5.2 on 2026-10-18 03:33
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def clamp_negative_quantities(apps, schema_editor):
+    # Product.clean() never allowed negative stock; fix any rows saved around it
+    # so the constraint can be added
+    Product = apps.get_model("products", "Product")
+    Product.objects.filter(quantity__lt=0).update(quantity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0011_product_search_vector"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(clamp_negative_quantities, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="product",
+            constraint=models.CheckConstraint(
+                condition=models.Q(("quantity__gte", 0)),
+                name="product_quantity_non_negative",
+            ),
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 5.2 on 2026-10-18 03:55
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_rollups(apps, schema_editor):
+    # Concurrent refreshes could insert the same row twice; keep the oldest copy
+    # (duplicates hold identical totals) so the constraints can be added
+    DailySalesRollup = apps.get_model("products", "DailySalesRollup")
+    duplicates = (
+        DailySalesRollup.objects.values("user_id", "date", "product_id", "category_id")
+        .annotate(count=Count("id"), keep=Min("id"))
+        .filter(count__gt=1)
+        .order_by()
+    )
+    for row in duplicates:
+        DailySalesRollup.objects.filter(
+            user_id=row["user_id"],
+            date=row["date"],
+            product_id=row["product_id"],
+            category_id=row["category_id"],
+        ).exclude(id=row["keep"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_product_quantity_non_negative"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_rollups, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="dailysalesrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("category__isnull", True), ("product__isnull", True)
+                ),
+                fields=("user", "date"),
+                name="dailysalesrollup_unique_totals",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailysalesrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(("product__isnull", False)),
+                fields=("user", "date", "product"),
+                name="dailysalesrollup_unique_product",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="dailysalesrollup",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(
+                    ("category__isnull", False), ("product__isnull", True)
+                ),
+                fields=("user", "date", "category"),
+                name="dailysalesrollup_unique_category",
+            ),
+        ),
+    ]
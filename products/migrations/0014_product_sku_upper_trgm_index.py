@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-18 04:10
+
+from django.db import migrations
+
+
+def create_sku_upper_index(apps, schema_editor):
+    # sku__icontains compiles to UPPER("sku"::text) LIKE UPPER(...), which an index
+    # on the raw column cannot serve; index the same expression instead
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_sku_upper_trgm_idx "
+        "ON products_product USING gin ((UPPER(sku::text)) gin_trgm_ops);"
+    )
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_sku_trgm_idx;")
+
+
+def drop_sku_upper_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS products_product_sku_trgm_idx "
+        "ON products_product USING gin (sku gin_trgm_ops);"
+    )
+    schema_editor.execute("DROP INDEX IF EXISTS products_product_sku_upper_trgm_idx;")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0013_daily_sales_rollup_unique"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_sku_upper_index, drop_sku_upper_index),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-18 04:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0014_product_sku_upper_trgm_index"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="sale",
+            index=models.Index(
+                fields=["user", "sale_date"], name="products_sa_user_id_074eca_idx"
+            ),
+        ),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
+from django.contrib.postgres.search import SearchVectorField
 from django.utils import timezone
 import uuid
 
@@ -38,9 +39,24 @@ class Product(models.Model):
     location = models.CharField(max_length=100, blank=True, null=True, help_text="Storage location")
     supplier = models.CharField(max_length=200, blank=True, null=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='products', null=True)
+    # Maintained by a database trigger on PostgreSQL (see migration 0011)
+    search_vector = SearchVectorField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pagination and filters of product_list, always scoped to one user
+            models.Index(fields=['user', 'name', 'id']),
+            models.Index(fields=['user', 'category']),
+            models.Index(fields=['user', 'status']),
+            models.Index(fields=['user', 'quantity', 'minimum_stock']),
+        ]
+        constraints = [
+            # Same rule as clean(), enforced for F() updates that bypass model validation
+            models.CheckConstraint(condition=models.Q(quantity__gte=0), name='product_quantity_non_negative'),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -93,12 +109,18 @@ class Sale(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Rollup refreshes read one user's sales of one day as a range scan
+            models.Index(fields=['user', 'sale_date']),
+        ]
+
     def __str__(self):
         return f"Sale #{self.invoice_number}"
 
     def save(self, *args, **kwargs):
-        # Calculate total amount from sale items if not set
-        if not self.total_amount:
+        # Calculate total amount from sale items if not set (a new sale has no items yet)
+        if not self.total_amount and self.pk:
             self.total_amount = sum(item.subtotal for item in self.items.all())
         super().save(*args, **kwargs)
 
@@ -116,6 +138,50 @@ class SaleItem(models.Model):
     def subtotal(self):
         return self.quantity * self.price
 
+class DailySalesRollup(models.Model):
+    """Pre-aggregated sales for one user and day.
+
+    Each day has a totals row (no product, no category), one row per product sold
+    and one row per category sold. Rows are rebuilt from Sale/SaleItem by
+    products.rollups whenever the underlying sales change.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sales_rollups')
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales_rollups', null=True, blank=True)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='sales_rollups', null=True, blank=True)
+    sale_count = models.PositiveIntegerField(default=0)
+    quantity = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['date']
+        indexes = [
+            models.Index(fields=['user', 'date']),
+        ]
+        # One totals, product and category row per user and day; NULLs are never
+        # equal in a plain unique constraint, so each row kind gets its own
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'date'],
+                condition=models.Q(product__isnull=True, category__isnull=True),
+                name='dailysalesrollup_unique_totals',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'date', 'product'],
+                condition=models.Q(product__isnull=False),
+                name='dailysalesrollup_unique_product',
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'date', 'category'],
+                condition=models.Q(product__isnull=True, category__isnull=False),
+                name='dailysalesrollup_unique_category',
+            ),
+        ]
+
+    def __str__(self):
+        return f"Sales rollup {self.date}"
+
 class InventorySnapshot(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inventory_snapshots')
     date = models.DateField(default=timezone.now)
@@ -130,6 +196,53 @@ class InventorySnapshot(models.Model):
     def __str__(self):
         return f"Inventory Snapshot {self.date}"
 
+class ExportJob(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    TARGET_CHOICES = [
+        ('products', 'Products'),
+        ('categories', 'Categories'),
+    ]
+
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('excel', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='export_jobs')
+    target = models.CharField(max_length=20, choices=TARGET_CHOICES)
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    filters = models.JSONField(default=dict)  # product_list filter parameters
+    fingerprint = models.CharField(max_length=64)  # Identifies identical requests
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    progress = models.PositiveSmallIntegerField(default=0)  # Percent complete
+    file = models.FileField(upload_to='exports/', blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    expires_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'fingerprint']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_target_display()} {self.get_export_format_display()} export #{self.pk}"
+
+    @property
+    def is_expired(self):
+        return self.expires_at is not None and self.expires_at <= timezone.now()
+
 class SavedReport(models.Model):
     REPORT_TYPES = [
         ('sales', 'Sales Report'),
@@ -0,0 +1,129 @@
+import base64
+import binascii
+import json
+import math
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 200
+PAGE_SIZE_CHOICES = [25, 50, 100, 200]
+
+
+def encode_cursor(value, pk):
+    """Opaque URL-safe token for a (sort value, id) position"""
+    return base64.urlsafe_b64encode(json.dumps([value, pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (sort value, id) position of a cursor, or None if it is malformed"""
+    try:
+        value, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    if not isinstance(value, (str, int, float)) or not isinstance(pk, int):
+        return None
+    return value, pk
+
+
+def clean_position(queryset, field, position):
+    """Convert a cursor's sort value to the type of the `field` ordering, or None if it doesn't fit.
+
+    A cursor made for another ordering (e.g. a name while paginating by
+    search_rank) would otherwise reach the database as a mistyped comparison.
+    """
+    value, pk = position
+    annotation = queryset.query.annotations.get(field)
+    try:
+        model_field = annotation.output_field if annotation is not None else queryset.model._meta.get_field(field)
+        value = model_field.to_python(value)
+    except (FieldDoesNotExist, ValidationError, TypeError, ValueError):
+        return None
+    if value is None or (isinstance(value, float) and not math.isfinite(value)):
+        return None
+    return value, pk
+
+
+def get_page_size(value):
+    """Parse a ?page_size= value, falling back to the default and capping it"""
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(page_size, MAX_PAGE_SIZE))
+
+
+class KeysetPage:
+    """One page of a (name, id) ordered queryset with cursors to its neighbours"""
+
+    def __init__(self, object_list, page_size, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.page_size = page_size
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def keyset_paginate(queryset, after=None, before=None, page_size=DEFAULT_PAGE_SIZE, order_by='name'):
+    """Paginate a queryset on (order_by, id) with cursors instead of OFFSET.
+
+    order_by is a field or annotation name, prefixed with '-' for descending
+    order; ties are always broken by ascending id. Each page is a range scan
+    that starts at the cursor, so page N costs the same as page 1.
+    """
+    descending = order_by.startswith('-')
+    field = order_by.lstrip('-')
+
+    position = decode_cursor(before) if before else None
+    backwards = position is not None
+    if not backwards and after:
+        position = decode_cursor(after)
+    # Malformed cursors and ones that don't match the ordering start from the first page
+    if position is not None:
+        position = clean_position(queryset, field, position)
+        backwards = backwards and position is not None
+
+    # Walking backwards reverses the ordering and the comparisons
+    forward_order = [order_by, 'id']
+    reverse_order = [field if descending else f'-{field}', '-id']
+    if position is None:
+        rows = list(queryset.order_by(*forward_order)[:page_size + 1])
+    else:
+        value, pk = position
+        beyond = 'lt' if descending != backwards else 'gt'
+        id_beyond = 'lt' if backwards else 'gt'
+        # The plain range condition keeps the scan on the index; the Q breaks ties on id
+        rows = list(queryset.filter(**{f'{field}__{beyond}e': value}).filter(
+            Q(**{f'{field}__{beyond}': value}) | Q(**{field: value, f'id__{id_beyond}': pk})
+        ).order_by(*(reverse_order if backwards else forward_order))[:page_size + 1])
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if backwards:
+        rows.reverse()
+
+    # Going forward there is a previous page whenever we started from a cursor;
+    # going backward there is always a next page (the one we came from)
+    next_cursor = None
+    previous_cursor = None
+    if rows:
+        if backwards or has_more:
+            next_cursor = encode_cursor(getattr(rows[-1], field), rows[-1].pk)
+        if (backwards and has_more) or (not backwards and position is not None):
+            previous_cursor = encode_cursor(getattr(rows[0], field), rows[0].pk)
+
+    return KeysetPage(rows, page_size, next_cursor, previous_cursor)
@@ -0,0 +1,87 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import UserPreference
+
+
+class LRUCache:
+    """Small thread-safe, process-local LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, max_size=1024, ttl=5):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Other worker processes only see an invalidation once their local copy expires,
+# so keep the local TTL short; the shared cache is invalidated immediately.
+local_preferences = LRUCache(
+    max_size=getattr(settings, 'PREFERENCE_CACHE_LOCAL_SIZE', 1024),
+    ttl=getattr(settings, 'PREFERENCE_CACHE_LOCAL_TTL', 5),
+)
+
+
+# Fields kept in the caches: plain data only, never the related User (or its password hash)
+PREFERENCE_FIELDS = ['id', 'theme', 'dashboard_widgets']
+
+
+def preference_cache_key(user_id):
+    return f'products:preferences:v2:{user_id}'
+
+
+def get_preferences(user):
+    """The user's UserPreference, rebuilt from plain data in the local LRU, the shared cache or the database.
+
+    Every call gets its own instance attached to `user`. Read from it, but load
+    the row (get_or_create) before changing and saving preferences.
+    """
+    key = preference_cache_key(user.pk)
+    data = local_preferences.get(key)
+    if data is None:
+        data = cache.get(key)
+        if data is None:
+            preference, created = UserPreference.objects.get_or_create(user=user)
+            data = {field: getattr(preference, field) for field in PREFERENCE_FIELDS}
+            cache.set(key, data, getattr(settings, 'PREFERENCE_CACHE_TTL', 300))
+        local_preferences.set(key, data)
+    # The cached widget dict is shared, so each instance gets a copy
+    return UserPreference(user=user, **copy.deepcopy(data))
+
+
+def invalidate_preferences(user_id):
+    key = preference_cache_key(user_id)
+    local_preferences.delete(key)
+    cache.delete(key)
@@ -0,0 +1,206 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Sum, Count, F, DecimalField
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Sale, SaleItem, DailySalesRollup
+from .caching import ANALYTICS_CACHE, bump_namespace
+
+# Sales with these statuses never count towards revenue
+EXCLUDED_STATUSES = ['cancelled']
+
+
+def _day_start(day):
+    """Start of a local calendar day as a datetime comparable with sale_date"""
+    start = datetime.combine(day, time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def _window(queryset, prefix, user_id, start_date, end_date):
+    """Restrict a Sale/SaleItem queryset to one user and a date window"""
+    # A half-open datetime range on the raw column, unlike sale_date__date, can use the (user, sale_date) index
+    filters = {}
+    if user_id is not None:
+        filters[f'{prefix}user_id'] = user_id
+    if start_date is not None:
+        filters[f'{prefix}sale_date__gte'] = _day_start(start_date)
+    if end_date is not None:
+        filters[f'{prefix}sale_date__lt'] = _day_start(end_date + timedelta(days=1))
+    return queryset.filter(**filters).exclude(**{f'{prefix}status__in': EXCLUDED_STATUSES})
+
+
+def compute_rollups(user_id=None, start_date=None, end_date=None):
+    """Build (unsaved) rollup rows from the raw sales with a handful of grouped queries"""
+    sales = _window(Sale.objects.all(), '', user_id, start_date, end_date)
+    items = _window(SaleItem.objects.all(), 'sale__', user_id, start_date, end_date)
+    revenue = Sum(F('quantity') * F('price'), output_field=DecimalField(max_digits=14, decimal_places=2))
+
+    # Units sold per user and day, folded into the totals rows below
+    quantities = {
+        (row['user_id'], row['day']): row['units']
+        for row in items.annotate(day=TruncDate('sale__sale_date'), user_id=F('sale__user_id'))
+                        .values('user_id', 'day').annotate(units=Sum('quantity')).order_by()
+    }
+
+    rollups = []
+    totals = sales.annotate(day=TruncDate('sale_date')).values('user_id', 'day').annotate(
+        sale_count=Count('id'), amount=Sum('total_amount')).order_by()
+    for row in totals:
+        rollups.append(DailySalesRollup(
+            user_id=row['user_id'],
+            date=row['day'],
+            sale_count=row['sale_count'],
+            quantity=quantities.get((row['user_id'], row['day'])) or 0,
+            revenue=row['amount'] or 0,
+        ))
+
+    per_product = items.annotate(day=TruncDate('sale__sale_date'), user_id=F('sale__user_id')).values(
+        'user_id', 'day', 'product_id', 'product__category_id').annotate(
+        sale_count=Count('sale_id', distinct=True), units=Sum('quantity'), amount=revenue).order_by()
+    for row in per_product:
+        rollups.append(DailySalesRollup(
+            user_id=row['user_id'],
+            date=row['day'],
+            product_id=row['product_id'],
+            category_id=row['product__category_id'],
+            sale_count=row['sale_count'],
+            quantity=row['units'] or 0,
+            revenue=row['amount'] or 0,
+        ))
+
+    per_category = items.annotate(day=TruncDate('sale__sale_date'), user_id=F('sale__user_id')).values(
+        'user_id', 'day', 'product__category_id').annotate(
+        sale_count=Count('sale_id', distinct=True), units=Sum('quantity'), amount=revenue).order_by()
+    for row in per_category:
+        rollups.append(DailySalesRollup(
+            user_id=row['user_id'],
+            date=row['day'],
+            category_id=row['product__category_id'],
+            sale_count=row['sale_count'],
+            quantity=row['units'] or 0,
+            revenue=row['amount'] or 0,
+        ))
+
+    return rollups
+
+
+# First key of the Postgres advisory locks that serialize rollup rebuilds
+ROLLUP_LOCK_KEY = 7201
+
+
+def lock_rollups(user_id=None):
+    """Hold off other rebuilds of a user's rollup (or of every user's) until this transaction ends.
+
+    Per-user rebuilds take a shared lock on the global key plus an exclusive one
+    on their user, so full rebuilds wait for all of them. Other databases
+    serialize writers on their own.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        if user_id is None:
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, 0)', [ROLLUP_LOCK_KEY])
+        else:
+            cursor.execute('SELECT pg_advisory_xact_lock_shared(%s, 0)', [ROLLUP_LOCK_KEY])
+            cursor.execute('SELECT pg_advisory_xact_lock(%s, %s)', [ROLLUP_LOCK_KEY, user_id])
+
+
+def rebuild_rollups(user_id=None, start_date=None, end_date=None, batch_size=1000):
+    """Replace the rollup rows in a window with freshly computed ones; returns the row count"""
+    existing = DailySalesRollup.objects.all()
+    if user_id is not None:
+        existing = existing.filter(user_id=user_id)
+    if start_date is not None:
+        existing = existing.filter(date__gte=start_date)
+    if end_date is not None:
+        existing = existing.filter(date__lte=end_date)
+
+    with transaction.atomic():
+        # Compute under the lock, so a concurrent rebuild can neither interleave
+        # its delete/insert with ours nor write rows from older sales after ours
+        lock_rollups(user_id)
+        rollups = compute_rollups(user_id, start_date, end_date)
+        existing.delete()
+        DailySalesRollup.objects.bulk_create(rollups, batch_size=batch_size)
+    bump_namespace(ANALYTICS_CACHE, user_id)
+    return len(rollups)
+
+
+def sale_day(sale_date):
+    """Local calendar day of a sale_date, the day its rollup rows are keyed on"""
+    if sale_date is None:
+        return None
+    if timezone.is_aware(sale_date):
+        return timezone.localdate(sale_date)
+    return sale_date.date()
+
+
+def refresh_daily_rollup(user_id, day):
+    """Recompute the rollup rows of a single user and day"""
+    return rebuild_rollups(user_id, day, day)
+
+
+def schedule_rollup_refresh(user_id, day):
+    """Refresh a day's rollup once the current transaction commits, at most once per transaction"""
+    key = (user_id, day)
+    # A sale and each of its items all ask for the same day; only the first
+    # request still pending in this transaction queues a refresh
+    if any(getattr(callback, 'rollup_key', None) == key for sids, callback, robust in connection.run_on_commit):
+        return
+
+    def refresh():
+        refresh_daily_rollup(user_id, day)
+
+    refresh.rollup_key = key
+    # A failed refresh is logged rather than raised: the sale is already committed, and
+    # `rebuild_sales_rollups --reconcile` repairs the day
+    transaction.on_commit(refresh, robust=True)
+
+
+def schedule_sale_refresh(sale_id):
+    """Refresh the day of a sale once the current transaction commits.
+
+    For callers that only know the sale's id: the ids are collected per
+    transaction and resolved to (user, day) with one query at commit, instead
+    of one lookup per caller (e.g. per item of a deleted product).
+    """
+    pending = next((callback for sids, callback, robust in connection.run_on_commit
+                    if hasattr(callback, 'sale_ids')), None)
+    if pending is None:
+        def pending():
+            days = {
+                (sale['user_id'], sale_day(sale['sale_date']))
+                for sale in Sale.objects.filter(pk__in=pending.sale_ids).values('user_id', 'sale_date')
+            }
+            for user_id, day in days:
+                refresh_daily_rollup(user_id, day)
+
+        pending.sale_ids = set()
+        transaction.on_commit(pending, robust=True)
+    pending.sale_ids.add(sale_id)
+
+
+def find_drift(user_id=None, start_date=None, end_date=None):
+    """Return the (user_id, date) pairs whose rollup totals no longer match the raw sales"""
+    expected = {
+        (row.user_id, row.date): (row.sale_count, row.revenue)
+        for row in compute_rollups(user_id, start_date, end_date)
+        if row.product_id is None and row.category_id is None
+    }
+
+    stored_rows = DailySalesRollup.objects.filter(product__isnull=True, category__isnull=True)
+    if user_id is not None:
+        stored_rows = stored_rows.filter(user_id=user_id)
+    if start_date is not None:
+        stored_rows = stored_rows.filter(date__gte=start_date)
+    if end_date is not None:
+        stored_rows = stored_rows.filter(date__lte=end_date)
+    stored = {
+        (row['user_id'], row['date']): (row['sale_count'], row['revenue'])
+        for row in stored_rows.values('user_id', 'date', 'sale_count', 'revenue')
+    }
+
+    return sorted(key for key in expected.keys() | stored.keys() if expected.get(key) != stored.get(key))
@@ -0,0 +1,155 @@
+from decimal import Decimal, InvalidOperation
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .models import Product, Sale, SaleItem
+from .stock import apply_stock_changes, invalidate_stock_caches
+
+PAYMENT_METHODS = [method for method, label in Sale.PAYMENT_METHODS]
+# Optional free-text fields of a sale, validated with the Sale model's field rules
+CUSTOMER_FIELDS = ['customer_name', 'customer_email', 'notes']
+
+
+def _decimal_limit(field):
+    """Smallest value too large for a DecimalField, and the step its values are rounded to"""
+    return Decimal(10) ** (field.max_digits - field.decimal_places), Decimal(1).scaleb(-field.decimal_places)
+
+
+PRICE_LIMIT, PRICE_STEP = _decimal_limit(SaleItem._meta.get_field('price'))
+TOTAL_LIMIT = _decimal_limit(Sale._meta.get_field('total_amount'))[0]
+
+
+class SaleError(Exception):
+    """Raised when a sale cannot be recorded; nothing is saved"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def parse_sale_items(lines):
+    """Validate [{'sku', 'quantity', 'price' (optional)}] lines into (sku, quantity, price or None)"""
+    if not isinstance(lines, list) or not lines:
+        raise SaleError(['A sale needs at least one item.'])
+
+    items = []
+    errors = []
+    for index, line in enumerate(lines):
+        if not isinstance(line, dict):
+            errors.append(f'Item {index + 1}: expected an object with "sku" and "quantity".')
+            continue
+        sku = str(line.get('sku') or '').strip()
+        quantity = line.get('quantity', 1)
+        price = line.get('price')
+        if not sku:
+            errors.append(f'Item {index + 1}: missing SKU.')
+            continue
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+            errors.append(f'Item {index + 1}: quantity of "{sku}" must be a positive integer.')
+            continue
+        if price is not None:
+            try:
+                price = None if isinstance(price, bool) else Decimal(str(price))
+            except InvalidOperation:
+                price = None
+            # Decimal() also accepts "NaN", "Infinity" and exponents like "1e20"
+            if price is None or not price.is_finite():
+                errors.append(f'Item {index + 1}: invalid price for "{sku}".')
+                continue
+            if price < 0:
+                errors.append(f'Item {index + 1}: price of "{sku}" cannot be negative.')
+                continue
+            # Compare before rounding too: quantize() fails on values beyond the context precision
+            if price >= PRICE_LIMIT or price.quantize(PRICE_STEP) >= PRICE_LIMIT:
+                errors.append(f'Item {index + 1}: price of "{sku}" must be less than {PRICE_LIMIT}.')
+                continue
+            price = price.quantize(PRICE_STEP)
+        items.append((sku, quantity, price))
+    if errors:
+        raise SaleError(errors)
+    return items
+
+
+def clean_customer_details(details):
+    """Validate {field: value} for CUSTOMER_FIELDS; returns the cleaned values or raises SaleError"""
+    cleaned = {}
+    errors = []
+    for name in CUSTOMER_FIELDS:
+        value = details.get(name)
+        if value is None:
+            cleaned[name] = None
+        elif not isinstance(value, str):
+            errors.append(f'{name}: must be a string.')
+        else:
+            try:
+                cleaned[name] = Sale._meta.get_field(name).clean(value.strip(), None)
+            except ValidationError as e:
+                errors.extend(f'{name}: {message}' for message in e.messages)
+    if errors:
+        raise SaleError(errors)
+    return cleaned
+
+
+def record_sale(user, lines, customer_name=None, customer_email=None, payment_method='cash', notes=None):
+    """Record a completed sale and take its items out of stock in one transaction.
+
+    Items are sold at the product's current price unless a price is given.
+    Returns (sale, {sku: new quantity}); raises SaleError if a SKU is unknown
+    or there is not enough stock, in which case nothing is saved.
+    """
+    details = clean_customer_details(
+        {'customer_name': customer_name, 'customer_email': customer_email, 'notes': notes})
+    items = parse_sale_items(lines)
+    if payment_method not in PAYMENT_METHODS:
+        raise SaleError([f'Unknown payment method "{payment_method}".'])
+
+    with transaction.atomic():
+        # Lock the sold products so concurrent sales can't oversell the same stock
+        products = {
+            product.sku: product
+            for product in Product.objects.select_for_update().filter(
+                user=user, sku__in={sku for sku, quantity, price in items}).only('id', 'sku', 'price', 'quantity')
+        }
+
+        errors = []
+        sold = {}
+        for sku, quantity, price in items:
+            if sku not in products:
+                errors.append(f'Unknown SKU "{sku}".')
+            else:
+                sold[sku] = sold.get(sku, 0) + quantity
+        for sku, quantity in sold.items():
+            if products[sku].quantity < quantity:
+                errors.append(f'"{sku}" has {products[sku].quantity} in stock, cannot sell {quantity}.')
+        if errors:
+            raise SaleError(errors)
+
+        # One pass builds the items and the total, so Sale.save never has to read them back
+        sale_items = []
+        total = Decimal('0')
+        for sku, quantity, price in items:
+            item = SaleItem(product=products[sku], quantity=quantity,
+                            price=products[sku].price if price is None else price)
+            sale_items.append(item)
+            total += item.subtotal
+        if total >= TOTAL_LIMIT:
+            raise SaleError([f'The sale total must be less than {TOTAL_LIMIT}.'])
+
+        sale = Sale.objects.create(
+            user=user,
+            payment_method=payment_method,
+            **details,
+            status='completed',
+            total_amount=total,
+        )
+        for item in sale_items:
+            item.sale = sale
+        SaleItem.objects.bulk_create(sale_items)
+
+        apply_stock_changes([(products[sku].pk, -quantity) for sku, quantity in sold.items()])
+        levels = {sku: products[sku].quantity - quantity for sku, quantity in sold.items()}
+
+    # The Sale post_save signal refreshes the daily rollup once this commits
+    invalidate_stock_caches(user.pk)
+    return sale, levels
@@ -0,0 +1,67 @@
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q, F, Case, When, Value, FloatField
+from django.db.models.functions import Greatest
+from django.utils.module_loading import import_string
+
+
+class SimpleSearchBackend:
+    """Substring search that works on any database (used for SQLite test databases)"""
+
+    def search(self, queryset, query):
+        """Filter products matching `query` and annotate a `search_rank` (higher is better)"""
+        return queryset.filter(
+            Q(name__icontains=query) |
+            Q(sku__icontains=query) |
+            Q(description__icontains=query)
+        ).annotate(search_rank=Case(
+            When(sku__iexact=query, then=Value(3.0)),
+            When(name__iexact=query, then=Value(2.0)),
+            When(name__istartswith=query, then=Value(1.5)),
+            When(Q(name__icontains=query) | Q(sku__icontains=query), then=Value(1.0)),
+            default=Value(0.5),
+            output_field=FloatField(),
+        ))
+
+
+class PostgresSearchBackend:
+    """Full-text search on Product.search_vector plus pg_trgm fuzzy matching on name and SKU.
+
+    Every predicate is served by a GIN index: the tsvector index for words in
+    name/SKU/description and the trigram index for misspelt names (migration
+    0011), and a trigram index on UPPER(sku), the expression sku__icontains
+    compiles to, for partial SKUs (migration 0014).
+    """
+    config = 'english'
+
+    def search(self, queryset, query):
+        """Filter products matching `query` and annotate a `search_rank` (higher is better)"""
+        from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+        search_query = SearchQuery(query, search_type='websearch', config=self.config)
+        return queryset.filter(
+            Q(search_vector=search_query) |
+            Q(name__trigram_similar=query) |
+            Q(sku__icontains=query)
+        ).annotate(search_rank=SearchRank(F('search_vector'), search_query) + Greatest(
+            TrigramSimilarity('name', query),
+            TrigramSimilarity('sku', query),
+        ))
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """The configured product search backend (PRODUCT_SEARCH_BACKEND), or one picked from the database"""
+    backend_path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if backend_path:
+        return import_string(backend_path)()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return SimpleSearchBackend()
+
+
+def search_products(queryset, query):
+    """Filter and rank a product queryset with the configured search backend"""
+    return get_search_backend().search(queryset, query)
@@ -0,0 +1,76 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_init, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, Category, Sale, SaleItem, UserPreference
+from .rollups import sale_day, schedule_rollup_refresh, schedule_sale_refresh
+from .preferences import invalidate_preferences
+from .widgets import invalidate_widgets
+from .caching import ANALYTICS_CACHE, bump_namespace
+from .middleware import install_query_recorder
+
+
+@receiver(post_init, sender=Sale)
+def remember_sale_rollup_key(sender, instance, **kwargs):
+    # Keep the original user/day so a moved sale also refreshes the day it left
+    instance._rollup_key = (instance.__dict__.get('user_id'), sale_day(instance.__dict__.get('sale_date')))
+
+
+@receiver(post_save, sender=Sale)
+def refresh_rollup_on_sale_save(sender, instance, **kwargs):
+    key = (instance.user_id, sale_day(instance.sale_date))
+    schedule_rollup_refresh(*key)
+    previous = getattr(instance, '_rollup_key', None)
+    if previous and previous != key and None not in previous:
+        schedule_rollup_refresh(*previous)
+    instance._rollup_key = key
+
+
+@receiver(post_delete, sender=Sale)
+def refresh_rollup_on_sale_delete(sender, instance, **kwargs):
+    schedule_rollup_refresh(instance.user_id, sale_day(instance.sale_date))
+
+
+@receiver(post_save, sender=SaleItem)
+@receiver(post_delete, sender=SaleItem)
+def refresh_rollup_on_sale_item_change(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Sale):
+        # The whole sale is being deleted; its own signal refreshes the day
+        return
+    # Items saved with their sale object know the day already; otherwise resolve
+    # the sale at commit, once for all items (e.g. those of a deleted product)
+    sale = instance._state.fields_cache.get('sale')
+    if sale is not None:
+        schedule_rollup_refresh(sale.user_id, sale_day(sale.sale_date))
+    else:
+        schedule_sale_refresh(instance.sale_id)
+
+
+@receiver(post_save, sender=UserPreference)
+@receiver(post_delete, sender=UserPreference)
+def invalidate_cached_preferences(sender, instance, **kwargs):
+    invalidate_preferences(instance.user_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_dashboard_widgets(sender, instance, **kwargs):
+    if instance.user_id is not None:
+        invalidate_widgets(instance.user_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_analytics_cache(sender, instance, **kwargs):
+    # Sales reach the analytics pages through the rollup, which bumps the namespace itself
+    if instance.user_id is not None:
+        bump_namespace(ANALYTICS_CACHE, instance.user_id)
+
+
+@receiver(connection_created)
+def add_query_recorder(sender, connection, **kwargs):
+    install_query_recorder(connection)
@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.db.models import Sum, Count, F, DecimalField
+from django.utils import timezone
+
+from .models import Product, SaleItem, InventorySnapshot
+from .rollups import EXCLUDED_STATUSES
+from .caching import ANALYTICS_CACHE, bump_namespace
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def compute_snapshots(day, user_ids=None):
+    """Build (unsaved) InventorySnapshot rows for every user with one grouped query.
+
+    For past days, stock is reconstructed by adding back the units sold after
+    `day`. Restocks are not recorded anywhere, so backfilled values are an
+    approximation; snapshots captured on the day itself are exact.
+    """
+    products = Product.objects.filter(user__isnull=False)
+    if user_ids is not None:
+        products = products.filter(user_id__in=user_ids)
+
+    is_past = day < timezone.localdate()
+    if is_past:
+        products = products.filter(created_at__date__lte=day)
+
+    totals = products.values('user_id').annotate(
+        value=Sum(F('quantity') * F('cost'), output_field=MONEY),
+        count=Count('id'),
+    ).order_by()
+
+    sold_after = {}
+    if is_past:
+        items = SaleItem.objects.filter(
+            product__in=products,
+            sale__sale_date__date__gt=day
+        ).exclude(sale__status__in=EXCLUDED_STATUSES)
+        sold_after = {
+            row['product__user_id']: row['value'] or 0
+            for row in items.values('product__user_id').annotate(
+                value=Sum(F('quantity') * F('product__cost'), output_field=MONEY)).order_by()
+        }
+
+    return [
+        InventorySnapshot(
+            user_id=row['user_id'],
+            date=day,
+            total_value=(row['value'] or Decimal('0')) + sold_after.get(row['user_id'], 0),
+            total_products=row['count'],
+        )
+        for row in totals
+    ]
+
+
+def capture_snapshots(day, user_ids=None, batch_size=1000):
+    """Upsert the snapshots of `day` on the (user, date) key; returns the row count"""
+    snapshots = compute_snapshots(day, user_ids)
+    InventorySnapshot.objects.bulk_create(
+        snapshots,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=['user', 'date'],
+        update_fields=['total_value', 'total_products'],
+    )
+    # A run over every user invalidates the whole namespace with one bump instead of one per user
+    if user_ids is None:
+        bump_namespace(ANALYTICS_CACHE)
+    else:
+        for user_id in {snapshot.user_id for snapshot in snapshots}:
+            bump_namespace(ANALYTICS_CACHE, user_id)
+    return len(snapshots)
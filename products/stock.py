@@ -0,0 +1,106 @@
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField
+from django.utils import timezone
+
+from .models import Product
+from .widgets import invalidate_widgets
+from .caching import ANALYTICS_CACHE, bump_namespace
+
+# Rows changed per UPDATE statement (one CASE branch per product)
+STOCK_UPDATE_CHUNK_SIZE = 500
+# Largest number of lines accepted in one adjustment request
+MAX_ADJUSTMENT_LINES = 5000
+# Largest value the quantity column (an IntegerField) holds on every supported database
+MAX_QUANTITY = 2 ** 31 - 1
+
+
+class StockAdjustmentError(Exception):
+    """Raised when any line of an adjustment is invalid; nothing is applied"""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def parse_adjustments(lines):
+    """Validate [{'sku': ..., 'delta': ...}] lines and merge repeated SKUs into {sku: delta}"""
+    if not isinstance(lines, list) or not lines:
+        raise StockAdjustmentError(['Expected a non-empty list of {"sku", "delta"} adjustments.'])
+    if len(lines) > MAX_ADJUSTMENT_LINES:
+        raise StockAdjustmentError([f'At most {MAX_ADJUSTMENT_LINES} adjustments are accepted per request.'])
+
+    deltas = {}
+    errors = []
+    for index, line in enumerate(lines):
+        sku = str(line.get('sku') or '').strip() if isinstance(line, dict) else ''
+        delta = line.get('delta') if isinstance(line, dict) else None
+        if not sku:
+            errors.append(f'Line {index + 1}: missing SKU.')
+        elif not isinstance(delta, int) or isinstance(delta, bool):
+            errors.append(f'Line {index + 1}: delta for "{sku}" must be an integer.')
+        elif abs(delta) > MAX_QUANTITY:
+            errors.append(f'Line {index + 1}: delta for "{sku}" must be between -{MAX_QUANTITY} and {MAX_QUANTITY}.')
+        else:
+            deltas[sku] = deltas.get(sku, 0) + delta
+    if errors:
+        raise StockAdjustmentError(errors)
+    return deltas
+
+
+def apply_stock_changes(changes):
+    """Add [(product_id, delta)] to product quantities in place, one CASE UPDATE per chunk"""
+    now = timezone.now()
+    for start in range(0, len(changes), STOCK_UPDATE_CHUNK_SIZE):
+        chunk = changes[start:start + STOCK_UPDATE_CHUNK_SIZE]
+        Product.objects.filter(pk__in=[pk for pk, delta in chunk]).update(
+            quantity=F('quantity') + Case(
+                *[When(pk=pk, then=Value(delta)) for pk, delta in chunk],
+                output_field=IntegerField(),
+            ),
+            updated_at=now,
+        )
+
+
+def invalidate_stock_caches(user_id):
+    # update() sends no signals, so drop the caches the product signals would have
+    invalidate_widgets(user_id)
+    bump_namespace(ANALYTICS_CACHE, user_id)
+
+
+def adjust_stock(user, lines):
+    """Apply stock movements to a user's products in one transaction; returns {sku: new quantity}.
+
+    Rows are locked while the new levels are checked, then updated in place with
+    F('quantity') + delta, so concurrent adjustments never overwrite each other.
+    The whole batch is rejected if a SKU is unknown or a level would leave 0..MAX_QUANTITY.
+    """
+    deltas = parse_adjustments(lines)
+
+    with transaction.atomic():
+        current = {
+            sku: (pk, quantity)
+            for sku, pk, quantity in Product.objects.select_for_update().filter(
+                user=user, sku__in=list(deltas)).values_list('sku', 'id', 'quantity')
+        }
+
+        errors = []
+        for sku, delta in deltas.items():
+            if sku not in current:
+                errors.append(f'Unknown SKU "{sku}".')
+            elif current[sku][1] + delta < 0:
+                errors.append(f'"{sku}" has {current[sku][1]} in stock, cannot remove {-delta}.')
+            elif current[sku][1] + delta > MAX_QUANTITY:
+                errors.append(f'"{sku}" has {current[sku][1]} in stock, cannot add {delta} '
+                              f'(at most {MAX_QUANTITY} units).')
+        if errors:
+            raise StockAdjustmentError(errors)
+
+        changes = [(current[sku][0], delta) for sku, delta in deltas.items() if delta]
+        apply_stock_changes(changes)
+
+        levels = dict(Product.objects.filter(pk__in=[pk for pk, quantity in current.values()])
+                      .values_list('sku', 'quantity'))
+
+    if changes:
+        invalidate_stock_caches(user.pk)
+    return levels
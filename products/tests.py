@@ -1,3 +1,742 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection, transaction
+from django.test import Client, TestCase, override_settings, tag
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .analytics import bucket_start, next_bucket, sales_time_series
+from .caching import ANALYTICS_CACHE
+from .export_jobs import request_export, run_export_job, purge_expired_exports
+from .importers import ImportResult, import_products, insert_products
+from .models import Product, Category, Sale, SaleItem, UserPreference, DailySalesRollup, ExportJob
+from .pagination import encode_cursor
+from .preferences import get_preferences, local_preferences, preference_cache_key
+from .rollups import find_drift, rebuild_rollups
+from .snapshots import capture_snapshots
+
+# Seeded data volumes; lower them for a quick local run, e.g. PERF_PRODUCTS=1000 PERF_SALES=5000
+PERF_USERS = int(os.environ.get('PERF_USERS', 3))
+PERF_PRODUCTS = int(os.environ.get('PERF_PRODUCTS', 10000))
+PERF_SALES = int(os.environ.get('PERF_SALES', 100000))
+PERF_CATEGORIES = int(os.environ.get('PERF_CATEGORIES', 20))
+# Multiplier applied to every time budget (e.g. 2 on a slow CI machine)
+PERF_TIME_FACTOR = float(os.environ.get('PERF_TIME_FACTOR', 1))
+PERF_REPORT = os.environ.get('PERF_REPORT', os.path.join(tempfile.gettempdir(), 'invent_perf_report.json'))
+
+
+def create_users(count):
+    users = [User.objects.create_user(f'perf-user-{i}', password='password') for i in range(count)]
+    UserPreference.objects.bulk_create(UserPreference(user=user) for user in users)
+    return users
+
+
+def create_categories(user, count):
+    return Category.objects.bulk_create(
+        Category(user=user, name=f'Category {i}', description=f'Category {i} of {user.username}')
+        for i in range(count)
+    )
+
+
+def create_products(user, categories, count, rng):
+    products = []
+    for i in range(count):
+        cost = Decimal(rng.randint(100, 50000)) / 100
+        products.append(Product(
+            user=user,
+            category=categories[i % len(categories)],
+            name=f'Product {i:05d}',
+            description=f'Description of product {i}',
+            sku=f'U{user.pk}-SKU-{i:05d}',
+            price=(cost * Decimal('1.4')).quantize(Decimal('0.01')),
+            cost=cost,
+            quantity=rng.randint(0, 500),
+            minimum_stock=rng.randint(0, 50),
+            maximum_stock=rng.randint(100, 1000),
+            supplier=f'Supplier {i % 37}',
+        ))
+    return Product.objects.bulk_create(products, batch_size=2000)
+
+
+def create_sales(user, products, count, rng, days=365):
+    """Completed (and a few cancelled) sales spread over the last `days` days, 1-3 items each"""
+    now = timezone.now()
+    sales = []
+    item_specs = []
+    for i in range(count):
+        items = [(rng.choice(products), rng.randint(1, 5)) for _ in range(rng.randint(1, 3))]
+        sales.append(Sale(
+            user=user,
+            invoice_number=f'U{user.pk}-INV-{i:06d}',
+            sale_date=now - timedelta(days=rng.randint(0, days - 1), minutes=rng.randint(0, 1439)),
+            status='cancelled' if rng.random() < 0.02 else 'completed',
+            total_amount=sum(product.price * quantity for product, quantity in items),
+        ))
+        item_specs.append(items)
+
+    sales = Sale.objects.bulk_create(sales, batch_size=2000)
+    SaleItem.objects.bulk_create(
+        (SaleItem(sale=sale, product=product, quantity=quantity, price=product.price)
+         for sale, items in zip(sales, item_specs) for product, quantity in items),
+        batch_size=5000,
+    )
+    return sales
+
+
+@tag('perf')
+class QueryBudgetTests(TestCase):
+    """Query-count and time budgets for the main views and exports on realistic data volumes.
+
+    Query counts must not grow with the data, so their budgets are exact
+    upper bounds; time budgets are generous and scaled by PERF_TIME_FACTOR.
+    Results are written to PERF_REPORT as JSON to compare runs over time.
+    """
+    results = []
+
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        start = time.perf_counter()
+        cls.users = create_users(PERF_USERS)
+        for user in cls.users:
+            categories = create_categories(user, PERF_CATEGORIES)
+            products = create_products(user, categories, PERF_PRODUCTS // PERF_USERS, rng)
+            create_sales(user, products, PERF_SALES // PERF_USERS, rng)
+        rebuild_rollups()
+        today = timezone.localdate()
+        for days_ago in range(30, -1, -1):
+            capture_snapshots(today - timedelta(days=days_ago))
+        cls.seed_seconds = time.perf_counter() - start
+        cls.user = cls.users[0]
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'seed_seconds': round(cls.seed_seconds, 1),
+            'volumes': {
+                'users': PERF_USERS,
+                'products': PERF_PRODUCTS,
+                'sales': PERF_SALES,
+                'categories_per_user': PERF_CATEGORIES,
+            },
+            'results': sorted(cls.results, key=lambda result: result['name']),
+        }
+        with open(PERF_REPORT, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        cache.clear()
+        local_preferences.clear()
+
+    def measure(self, name, url, max_queries, max_ms):
+        """GET `url` and assert its query count and wall time stay within budget"""
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.client.get(url)
+            if response.streaming:
+                for chunk in response.streaming_content:
+                    pass
+            elapsed_ms = (time.perf_counter() - start) * 1000
+        response.close()
+
+        self.assertEqual(response.status_code, 200, name)
+        max_ms *= PERF_TIME_FACTOR
+        self.results.append({
+            'name': name,
+            'url': url,
+            'queries': len(queries),
+            'max_queries': max_queries,
+            'ms': round(elapsed_ms, 1),
+            'max_ms': max_ms,
+        })
+        self.assertLessEqual(len(queries), max_queries, '{} ran {} queries:\n{}'.format(
+            name, len(queries), '\n'.join(query['sql'] for query in queries.captured_queries)))
+        self.assertLessEqual(elapsed_ms, max_ms, f'{name} took {elapsed_ms:.0f} ms')
+        return response
+
+    def test_dashboard(self):
+        self.measure('dashboard', reverse('dashboard'), 7, 500)
+        self.measure('dashboard (cached)', reverse('dashboard'), 2, 100)
+
+    def test_product_list(self):
+        self.measure('product_list', reverse('product_list'), 5, 500)
+        self.measure('product_list (filtered)', reverse('product_list') + '?low_stock=1&status=active', 5, 500)
+        self.measure('product_list (search)', reverse('product_list') + '?search=Product+001', 5, 1000)
+
+    def test_category_list(self):
+        self.measure('category_list', reverse('category_list'), 4, 500)
+
+    def test_analytics(self):
+        self.measure('sales_trends', reverse('sales_trends'), 5, 500)
+        self.measure('sales_trends (year, weekly)', reverse('sales_trends') + '?days=365&granularity=week', 5, 500)
+        self.measure('inventory_value', reverse('inventory_value'), 5, 500)
+        self.measure('product_performance', reverse('product_performance'), 5, 3000)
+        self.measure('custom_reports', reverse('custom_reports'), 3, 500)
+
+    @override_settings(EXPORT_ASYNC_THRESHOLD=10 ** 9)
+    def test_product_exports(self):
+        for export_format, max_ms in [('csv', 3000), ('excel', 10000), ('pdf', 30000)]:
+            self.measure(f'product export ({export_format})',
+                         reverse('product_list') + f'?export={export_format}', 5, max_ms)
+
+    @override_settings(EXPORT_ASYNC_THRESHOLD=10 ** 9)
+    def test_category_exports(self):
+        for export_format in ['csv', 'excel', 'pdf']:
+            self.measure(f'category export ({export_format})',
+                         reverse('category_list') + f'?export={export_format}', 5, 1000)
+
+
+class AnalyticsCacheTests(TestCase):
+    """Cached analytics data must not leak one session's page state into another"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users(1)[0]
+        categories = create_categories(cls.user, 2)
+        products = create_products(cls.user, categories, 20, random.Random(1))
+        create_sales(cls.user, products, 50, random.Random(1), days=30)
+        rebuild_rollups()
+
+    def setUp(self):
+        cache.clear()
+        local_preferences.clear()
+
+    def session(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        return client
+
+    def test_second_session_gets_its_own_csrf_token(self):
+        for name in ['sales_trends', 'inventory_value', 'product_performance']:
+            self.session().get(reverse(name))
+
+            client = self.session()
+            response = client.get(reverse(name))
+            token = re.search(r"'X-CSRFToken': '([^']+)'", response.content.decode()).group(1)
+            response = client.post(reverse('save_theme_preference'), json.dumps({'theme': 'dark'}),
+                                   content_type='application/json', HTTP_X_CSRFTOKEN=token)
+            self.assertEqual(response.status_code, 200, name)
+
+    def test_chart_data_is_cached(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('sales_trends'))
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('sales_trends'))
+        self.assertFalse([query for query in queries.captured_queries if 'rollup' in query['sql']])
+
+
+class RollupMaintenanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users(1)[0]
+        categories = create_categories(cls.user, 2)
+        cls.products = create_products(cls.user, categories, 3, random.Random(1))
+
+    def sell(self):
+        with transaction.atomic():
+            sale = Sale.objects.create(user=self.user, total_amount=sum(product.price * 2 for product in self.products))
+            for product in self.products:
+                SaleItem.objects.create(sale=sale, product=product, quantity=2, price=product.price)
+        return sale
+
+    def test_one_refresh_per_day_and_transaction(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.sell()
+        refreshes = [callback for callback in callbacks if hasattr(callback, 'rollup_key')]
+        self.assertEqual(len(refreshes), 1)
+
+    def test_rebuilds_never_duplicate_rows(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            sale = self.sell()
+        rebuild_rollups(self.user.pk)
+        rebuild_rollups(self.user.pk)
+
+        day = timezone.localdate(sale.sale_date)
+        rows = DailySalesRollup.objects.filter(user=self.user, date=day)
+        self.assertEqual(rows.filter(product__isnull=True, category__isnull=True).count(), 1)
+        self.assertEqual(rows.filter(product__isnull=False).count(), len(self.products))
+        totals = rows.get(product__isnull=True, category__isnull=True)
+        self.assertEqual(totals.revenue, sum(product.price * 2 for product in self.products))
+
+    def seed_sale(self, items):
+        # bulk_create sends no signals, so this transaction has no refresh queued
+        # that would absorb the ones under test
+        sale, = create_sales(self.user, self.products, 1, random.Random(1), days=1)
+        SaleItem.objects.bulk_create(
+            SaleItem(sale=sale, product=self.products[0], quantity=1, price=1) for _ in range(items))
+        rebuild_rollups(self.user.pk)
+        return Sale.objects.get(pk=sale.pk)
+
+    def test_deleting_a_sale_does_not_look_it_up_per_item(self):
+        sale = self.seed_sale(50)
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            sale.delete()
+        sale_selects = [query for query in queries.captured_queries
+                        if query['sql'].startswith('SELECT') and 'FROM "products_sale"' in query['sql']]
+        self.assertLessEqual(len(sale_selects), 2)
+        self.assertFalse(DailySalesRollup.objects.filter(user=self.user).exists())
+
+    def test_deleting_a_product_refreshes_the_days_it_sold_on(self):
+        self.seed_sale(1)
+        product = self.products[0]
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.get(pk=product.pk).delete()
+
+        self.assertFalse(DailySalesRollup.objects.filter(product=product.pk).exists())
+        self.assertEqual(find_drift(self.user.pk), [])
+
+    def test_duplicate_totals_row_is_rejected(self):
+        day = timezone.localdate()
+        DailySalesRollup.objects.create(user=self.user, date=day)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            DailySalesRollup.objects.create(user=self.user, date=day)
+
+
+class SaleRecordTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users(1)[0]
+        categories = create_categories(cls.user, 1)
+        cls.hammer, cls.saw = create_products(cls.user, categories, 2, random.Random(1))
+        Product.objects.filter(pk=cls.hammer.pk).update(quantity=10)
+        Product.objects.filter(pk=cls.saw.pk).update(quantity=1)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def record(self, items, **data):
+        return self.client.post(reverse('sale_record'), json.dumps({'items': items, **data}),
+                                content_type='application/json')
+
+    def test_records_sale_and_takes_items_out_of_stock(self):
+        response = self.record([
+            {'sku': self.hammer.sku, 'quantity': 3},
+            {'sku': self.saw.sku, 'quantity': 1, 'price': '9.99'},
+        ], payment_method='credit_card')
+
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['levels'], {self.hammer.sku: 7, self.saw.sku: 0})
+        self.assertEqual(Decimal(data['total_amount']), self.hammer.price * 3 + Decimal('9.99'))
+        sale = Sale.objects.get(pk=data['sale_id'])
+        self.assertEqual(sale.items.count(), 2)
+        self.assertEqual(sale.total_amount, Decimal(data['total_amount']))
+        self.assertEqual(Product.objects.get(pk=self.hammer.pk).quantity, 7)
+
+    def test_failed_rollup_refresh_does_not_fail_the_sale(self):
+        with mock.patch('products.rollups.refresh_daily_rollup', side_effect=RuntimeError('database gone')), \
+                self.assertLogs(level='ERROR'), self.captureOnCommitCallbacks(execute=True):
+            response = self.record([{'sku': self.hammer.sku, 'quantity': 1}])
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Sale.objects.exists())
+
+    def test_insufficient_stock_saves_nothing(self):
+        response = self.record([
+            {'sku': self.hammer.sku, 'quantity': 1},
+            {'sku': self.saw.sku, 'quantity': 2},
+        ])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cannot sell 2', response.json()['errors'][0])
+        self.assertFalse(Sale.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.hammer.pk).quantity, 10)
+
+    def test_malformed_lines_are_rejected(self):
+        sku = self.hammer.sku
+        for items in [
+            [],
+            ['not an object'],
+            [{'quantity': 1}],
+            [{'sku': sku, 'quantity': 0}],
+            [{'sku': sku, 'quantity': '2'}],
+            [{'sku': sku, 'quantity': 1, 'price': 'abc'}],
+            [{'sku': sku, 'quantity': 1, 'price': 'NaN'}],
+            [{'sku': sku, 'quantity': 1, 'price': 'Infinity'}],
+            [{'sku': sku, 'quantity': 1, 'price': '1e20'}],
+            [{'sku': sku, 'quantity': 1, 'price': -1}],
+            [{'sku': sku, 'quantity': 1, 'price': True}],
+            [{'sku': 'UNKNOWN', 'quantity': 1}],
+        ]:
+            response = self.record(items)
+            self.assertEqual(response.status_code, 400, items)
+            self.assertFalse(response.json()['success'])
+            self.assertTrue(response.json()['errors'], items)
+        self.assertFalse(Sale.objects.exists())
+
+    def test_customer_details_are_validated(self):
+        line = {'sku': self.hammer.sku, 'quantity': 1}
+        for details in [
+            {'customer_name': {'first': 'Ann'}},
+            {'customer_name': 'x' * 201},
+            {'customer_email': 'not-an-email'},
+            {'notes': ['a', 'list']},
+        ]:
+            response = self.record([line], **details)
+            self.assertEqual(response.status_code, 400, details)
+            self.assertTrue(response.json()['errors'][0].startswith(next(iter(details))), details)
+        self.assertFalse(Sale.objects.exists())
+
+        response = self.record([line], customer_name=' Ann ', customer_email='ann@example.com')
+        self.assertEqual(response.status_code, 201)
+        sale = Sale.objects.get()
+        self.assertEqual((sale.customer_name, sale.customer_email), ('Ann', 'ann@example.com'))
+
+    def test_total_that_overflows_is_rejected(self):
+        Product.objects.filter(pk=self.hammer.pk).update(quantity=1000)
+        response = self.record([{'sku': self.hammer.sku, 'quantity': 1000, 'price': '99999999.99'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Sale.objects.exists())
+
+
+class ProductListPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users(1)[0]
+        categories = create_categories(cls.user, 1)
+        cls.products = create_products(cls.user, categories, 5, random.Random(1))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def names(self, **params):
+        response = self.client.get(reverse('product_list'), {'page_size': 2, **params})
+        self.assertEqual(response.status_code, 200)
+        return [product.name for product in response.context['page']]
+
+    def test_cursor_continues_after_position(self):
+        self.assertEqual(self.names(after=encode_cursor('Product 00001', self.products[1].pk)),
+                         ['Product 00002', 'Product 00003'])
+
+    def test_cursor_of_wrong_type_falls_back_to_first_page(self):
+        first_page = self.names(search='Product')
+        for cursor in [encode_cursor('Product 00001', self.products[1].pk), encode_cursor([], 1), 'garbage']:
+            self.assertEqual(self.names(search='Product', after=cursor), first_page, cursor)
+            self.assertEqual(self.names(search='Product', before=cursor), first_page, cursor)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ExportJobTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other_user = create_users(2)
+        categories = create_categories(cls.user, 1)
+        cls.products = create_products(cls.user, categories, 3, random.Random(1))
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_identical_request_reuses_job_until_data_changes(self):
+        job = request_export(self.user, 'products', 'csv', {'status': 'active'})
+        self.assertEqual(request_export(self.user, 'products', 'csv', {'status': 'active'}), job)
+        self.assertNotEqual(request_export(self.user, 'products', 'csv', {}), job)
+        self.assertNotEqual(request_export(self.user, 'categories', 'csv', {'status': 'active'}), job)
+
+        self.products[0].name = 'Renamed product'
+        self.products[0].save()
+        self.assertNotEqual(request_export(self.user, 'products', 'csv', {'status': 'active'}), job)
+
+    def test_timed_out_running_job_is_not_reused_and_fails(self):
+        job = request_export(self.user, 'products', 'csv')
+        ExportJob.objects.filter(pk=job.pk).update(status='running', started_at=timezone.now() - timedelta(hours=1))
+
+        self.assertNotEqual(request_export(self.user, 'products', 'csv'), job)
+        purge_expired_exports()
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+
+    def test_job_runs_and_file_is_downloadable_by_owner_only(self):
+        job = request_export(self.user, 'products', 'csv')
+        self.assertEqual(job.status, 'pending')
+        run_export_job(job.pk)
+        self.assertIsNone(run_export_job(job.pk))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.progress), ('completed', 100))
+        status = self.client.get(reverse('export_job_status', args=[job.pk])).json()
+        self.assertEqual(status['download_url'], reverse('export_job_download', args=[job.pk]))
+
+        response = self.client.get(status['download_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(self.products[0].sku, b''.join(response.streaming_content).decode())
+
+        self.client.force_login(self.other_user)
+        self.assertEqual(self.client.get(status['download_url']).status_code, 404)
+
+    def test_purge_removes_expired_and_old_failed_jobs(self):
+        job = request_export(self.user, 'products', 'csv')
+        run_export_job(job.pk)
+        old = timezone.now() - timedelta(days=2)
+        failed = ExportJob.objects.create(user=self.user, target='products', export_format='csv',
+                                          fingerprint='failed', status='failed')
+        recent_failed = ExportJob.objects.create(user=self.user, target='products', export_format='csv',
+                                                 fingerprint='recent', status='failed')
+        ExportJob.objects.filter(pk=failed.pk).update(created_at=old)
+        ExportJob.objects.filter(pk=job.pk).update(expires_at=old)
+        file_name = ExportJob.objects.get(pk=job.pk).file.name
+
+        self.assertEqual(purge_expired_exports(), 2)
+        self.assertEqual(list(ExportJob.objects.values_list('pk', flat=True)), [recent_failed.pk])
+        self.assertFalse(job.file.storage.exists(file_name))
+
+
+class SnapshotCacheTests(TestCase):
+    def test_capture_for_all_users_bumps_namespace_once(self):
+        users = create_users(3)
+        for user in users:
+            create_products(user, create_categories(user, 1), 2, random.Random(user.pk))
+
+        with mock.patch('products.snapshots.bump_namespace') as bump:
+            self.assertEqual(capture_snapshots(timezone.localdate()), 3)
+        bump.assert_called_once_with(ANALYTICS_CACHE)
+
+        with mock.patch('products.snapshots.bump_namespace') as bump:
+            capture_snapshots(timezone.localdate(), [users[0].pk])
+        bump.assert_called_once_with(ANALYTICS_CACHE, users[0].pk)
+
+
+class ProductImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other_user = create_users(2)
+        cls.category = create_categories(cls.user, 1)[0]
+        cls.existing, = create_products(cls.user, [cls.category], 1, random.Random(1))
+        cls.foreign, = create_products(cls.other_user, create_categories(cls.other_user, 1), 1, random.Random(2))
+
+    def import_csv(self, *lines, **kwargs):
+        content = '\n'.join(['sku,name,category,price,cost'] + list(lines)).encode()
+        return import_products(self.user, io.BytesIO(content), 'products.csv', **kwargs)
+
+    def test_counts_and_row_errors(self):
+        result = self.import_csv(
+            f'{self.existing.sku},Updated name,{self.category.name},12.50,10',
+            f'NEW-1,New product,{self.category.name},5,3',
+            f'{self.foreign.sku},Hijack,{self.category.name},5,3',
+            f'NEW-1,Duplicate,{self.category.name},5,3',
+            f'NEW-2,Bad price,{self.category.name},abc,3',
+        )
+
+        self.assertEqual((result.created, result.updated), (1, 1))
+        self.assertEqual([row_number for row_number, messages in result.errors], [4, 5, 6])
+        self.assertIn('another account', result.errors[0][1][0])
+        self.assertEqual(Product.objects.get(pk=self.existing.pk).name, 'Updated name')
+        self.assertEqual(Product.objects.get(sku='NEW-1').user, self.user)
+        self.assertEqual(Product.objects.get(pk=self.foreign.pk).name, self.foreign.name)
+
+    def test_dry_run_counts_without_saving(self):
+        result = self.import_csv(f'NEW-1,New product,{self.category.name},5,3', dry_run=True)
+        self.assertEqual(result.created, 1)
+        self.assertFalse(Product.objects.filter(sku='NEW-1').exists())
+
+    def test_unreadable_files_are_reported(self):
+        self.client.force_login(self.user)
+        too_long = 'x' * (csv.field_size_limit() + 1)
+        for name, content in [
+            ('products.xlsx', b'this is not a workbook'),
+            ('products.xlsx', b'PK\x03\x04 truncated zip'),
+            ('products.csv', f'sku,name\nSKU-1,{too_long}\n'.encode()),
+        ]:
+            response = self.client.post(reverse('product_import'), {'file': SimpleUploadedFile(name, content)})
+            self.assertEqual(response.status_code, 200, name)
+            self.assertContains(response, 'could not be read' if name.endswith('.csv') else 'not a valid Excel')
+
+    def test_sku_taken_during_import_is_a_row_error(self):
+        # Another account inserted this SKU between the lookup and the insert
+        result = ImportResult()
+        rows = [
+            (2, Product(user=self.user, category=self.category, name='Taken', sku=self.foreign.sku,
+                        price=5, cost=3)),
+            (3, Product(user=self.user, category=self.category, name='Free', sku='NEW-3', price=5, cost=3)),
+        ]
+        self.assertEqual(insert_products(rows, result), 1)
+        self.assertEqual([row_number for row_number, messages in result.errors], [2])
+        self.assertEqual(Product.objects.get(pk=self.foreign.pk).user, self.other_user)
+        self.assertTrue(Product.objects.filter(sku='NEW-3', user=self.user).exists())
+
+
+class ProductPerformanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users(1)[0]
+        cls.products = create_products(cls.user, create_categories(cls.user, 1), 4, random.Random(1))
+        for product, revenue in zip(cls.products, [20, 40, 10, 30]):
+            DailySalesRollup.objects.create(user=cls.user, date=timezone.localdate(), product=product,
+                                            quantity=1, revenue=revenue)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def ranking(self, **params):
+        response = self.client.get(reverse('product_performance'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.context['top_products'], response.context['bottom_products']
+
+    def test_top_and_bottom_products(self):
+        top, bottom = self.ranking(top=2, bottom=2)
+        self.assertEqual(top, [('Product 00001', 40.0), ('Product 00003', 30.0)])
+        self.assertEqual(bottom, [('Product 00002', 10.0), ('Product 00000', 20.0)])
+
+    def test_counts_are_clamped(self):
+        top, bottom = self.ranking(top=-1, bottom='abc')
+        self.assertEqual(len(top), 1)
+        self.assertEqual(len(bottom), 4)
+
+    def test_days_are_parsed(self):
+        for days in ['abc', '-5', '99999999999']:
+            top, bottom = self.ranking(days=days)
+            self.assertEqual(len(top), 4, days)
+
+
+class SalesTrendsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users(1)[0]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_invalid_days_do_not_fail_the_page(self):
+        for days in ['-1', '0', 'abc', '99999999999']:
+            response = self.client.get(reverse('sales_trends'), {'days': days})
+            self.assertEqual(response.status_code, 200, days)
+
+
+class SalesTimeSeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_users(1)[0]
+
+    def add_totals(self, *days_and_revenue):
+        DailySalesRollup.objects.bulk_create(
+            DailySalesRollup(user=self.user, date=day, sale_count=1, revenue=revenue)
+            for day, revenue in days_and_revenue)
+
+    def test_buckets(self):
+        sunday = date(2026, 10, 18)
+        self.assertEqual(bucket_start(sunday, 'week'), date(2026, 10, 12))
+        self.assertEqual(bucket_start(date(2026, 10, 12), 'week'), date(2026, 10, 12))
+        self.assertEqual(next_bucket(date(2026, 10, 12), 'week'), date(2026, 10, 19))
+        self.assertEqual(bucket_start(sunday, 'month'), date(2026, 10, 1))
+        self.assertEqual(next_bucket(date(2026, 1, 1), 'month'), date(2026, 2, 1))
+        self.assertEqual(next_bucket(date(2026, 12, 1), 'month'), date(2027, 1, 1))
+        self.assertEqual(bucket_start(sunday, 'day'), sunday)
+        self.assertEqual(next_bucket(date(2026, 12, 31), 'day'), date(2027, 1, 1))
+
+    def test_daily_series_fills_empty_days(self):
+        self.add_totals((date(2026, 3, 2), 5))
+        series = sales_time_series(self.user, date(2026, 3, 1), date(2026, 3, 3))
+        self.assertEqual(series, {'dates': ['2026-03-01', '2026-03-02', '2026-03-03'], 'amounts': [0, 5, 0]})
+
+    def test_weekly_series_starts_on_monday(self):
+        self.add_totals((date(2026, 10, 14), 1), (date(2026, 10, 18), 2), (date(2026, 10, 26), 4))
+        series = sales_time_series(self.user, date(2026, 10, 14), date(2026, 11, 3), 'week')
+        self.assertEqual(series['dates'], ['2026-10-12', '2026-10-19', '2026-10-26', '2026-11-02'])
+        self.assertEqual(series['amounts'], [3, 0, 4, 0])
+
+    def test_monthly_series_crosses_month_and_year_boundaries(self):
+        self.add_totals((date(2025, 11, 30), 1), (date(2025, 12, 1), 2), (date(2025, 12, 31), 3), (date(2026, 1, 1), 4))
+        series = sales_time_series(self.user, date(2025, 11, 20), date(2026, 2, 5), 'month')
+        self.assertEqual(series['dates'], ['2025-11-01', '2025-12-01', '2026-01-01', '2026-02-01'])
+        self.assertEqual(series['amounts'], [1, 5, 4, 0])
+
+
+class StockAdjustTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other_user = create_users(2)
+        cls.hammer, cls.saw = create_products(cls.user, create_categories(cls.user, 1), 2, random.Random(1))
+        cls.foreign, = create_products(cls.other_user, create_categories(cls.other_user, 1), 1, random.Random(2))
+        Product.objects.filter(pk=cls.hammer.pk).update(quantity=10)
+        Product.objects.filter(pk=cls.saw.pk).update(quantity=3)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def adjust(self, *adjustments):
+        return self.client.post(reverse('stock_adjust'), json.dumps({'adjustments': list(adjustments)}),
+                                content_type='application/json')
+
+    def quantities(self):
+        return list(Product.objects.filter(user=self.user).order_by('name').values_list('quantity', flat=True))
+
+    def test_out_of_range_deltas_are_line_errors(self):
+        response = self.adjust({'sku': self.hammer.sku, 'delta': 10 ** 12})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(response.json()['errors'][0].startswith('Line 1:'))
+
+        response = self.adjust({'sku': self.hammer.sku, 'delta': 2 ** 31 - 5})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.quantities(), [10, 3])
+
+    def test_applies_batch_and_returns_levels(self):
+        response = self.adjust({'sku': self.hammer.sku, 'delta': 5}, {'sku': self.saw.sku, 'delta': -3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['levels'], {self.hammer.sku: 15, self.saw.sku: 0})
+        self.assertEqual(self.quantities(), [15, 0])
+
+    def test_repeated_skus_are_merged(self):
+        response = self.adjust({'sku': self.saw.sku, 'delta': -2}, {'sku': self.saw.sku, 'delta': 4},
+                               {'sku': self.saw.sku, 'delta': -5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['levels'], {self.saw.sku: 0})
+
+    def test_unknown_and_foreign_skus_are_rejected(self):
+        response = self.adjust({'sku': self.hammer.sku, 'delta': 1}, {'sku': 'UNKNOWN', 'delta': 1},
+                               {'sku': self.foreign.sku, 'delta': 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['errors'],
+                         ['Unknown SKU "UNKNOWN".', f'Unknown SKU "{self.foreign.sku}".'])
+        self.assertEqual(self.quantities(), [10, 3])
+        self.assertEqual(Product.objects.get(pk=self.foreign.pk).quantity, self.foreign.quantity)
+
+    def test_batch_going_below_zero_applies_nothing(self):
+        response = self.adjust({'sku': self.hammer.sku, 'delta': -1}, {'sku': self.saw.sku, 'delta': -4})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cannot remove 4', response.json()['errors'][0])
+        self.assertEqual(self.quantities(), [10, 3])
+
+
+class PreferenceCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        local_preferences.clear()
+        self.user = create_users(1)[0]
+
+    def test_caches_plain_data_only(self):
+        preference = get_preferences(self.user)
+        self.assertEqual(preference.theme, 'light')
+
+        cached = cache.get(preference_cache_key(self.user.pk))
+        self.assertEqual(set(cached), {'id', 'theme', 'dashboard_widgets'})
+        self.assertNotIn(self.user.password, repr(cached))
+
+    def test_each_call_gets_its_own_instance(self):
+        first = get_preferences(self.user)
+        first.dashboard_widgets['total_products'] = {'enabled': False}
+        self.user.username = 'renamed'
+
+        second = get_preferences(self.user)
+        self.assertIsNot(second, first)
+        self.assertEqual(second.user.username, 'renamed')
+        self.assertNotEqual(second.dashboard_widgets.get('total_products'), {'enabled': False})
+        with self.assertNumQueries(0):
+            self.assertTrue(second.is_widget_enabled('total_products'))
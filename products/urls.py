@@ -2,17 +2,29 @@ from django.urls import path
 from . import views
 from . import views_analytics
 from . import views_dashboard
+from . import views_exports
+from . import views_imports
+from . import views_stock
+from . import views_sales
 
 urlpatterns = [
     # Main views
     path('', views.dashboard, name='dashboard'),
     path('products/', views.product_list, name='product_list'),
     path('products/create/', views.product_create, name='product_create'),
+    path('products/import/', views_imports.product_import, name='product_import'),
+    path('products/stock/adjust/', views_stock.stock_adjust, name='stock_adjust'),
+    path('sales/record/', views_sales.sale_record, name='sale_record'),
     path('products/<int:pk>/', views.product_detail, name='product_detail'),
     path('products/<int:pk>/edit/', views.product_edit, name='product_edit'),
     path('categories/', views.category_list, name='category_list'),
     path('categories/create/', views.category_create, name='category_create'),
 
+    # Background exports
+    path('exports/<int:pk>/', views_exports.export_job_detail, name='export_job_detail'),
+    path('exports/<int:pk>/status/', views_exports.export_job_status, name='export_job_status'),
+    path('exports/<int:pk>/download/', views_exports.export_job_download, name='export_job_download'),
+
     # Analytics views
     path('analytics/sales-trends/', views_analytics.sales_trends, name='sales_trends'),
     path('analytics/inventory-value/', views_analytics.inventory_value, name='inventory_value'),
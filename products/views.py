@@ -1,45 +1,34 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.db.models import Sum, Count, F, Q
+from django.db.models import Count
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.http import HttpResponse
-from .models import Product, Category, UserPreference
+from django.conf import settings
+from .models import Product, Category
 from .forms import ProductForm, CategoryForm
+from .filters import filter_products, product_filter_params
+from .export_jobs import request_export
+from .pagination import keyset_paginate, get_page_size, PAGE_SIZE_CHOICES
+from .widgets import get_widget_data
 from .export import (
     export_products_csv, export_products_excel, export_products_pdf,
     export_categories_csv, export_categories_excel, export_categories_pdf
 )
 
+def is_large_export(queryset):
+    """Whether an export should run as a background job rather than inside the request"""
+    threshold = getattr(settings, 'EXPORT_ASYNC_THRESHOLD', 1000)
+    return queryset.count() > threshold
+
 @login_required
 def dashboard(request):
-    # Get user preferences for dashboard widgets
-    preference, created = UserPreference.objects.get_or_create(user=request.user)
-
-    # Prepare data for all widgets
-    widget_data = {}
-
-    # Only calculate data for enabled widgets
-    if preference.is_widget_enabled('total_products'):
-        widget_data['total_products'] = Product.objects.filter(user=request.user).count()
-
-    if preference.is_widget_enabled('total_categories'):
-        widget_data['total_categories'] = Category.objects.filter(user=request.user).count()
-
-    if preference.is_widget_enabled('low_stock_products'):
-        widget_data['low_stock_products'] = Product.objects.filter(
-            user=request.user, quantity__lte=F('minimum_stock')).count()
+    # Get user preferences for dashboard widgets (cached, see ThemeMiddleware)
+    preference = request.preferences
 
-    if preference.is_widget_enabled('total_value'):
-        widget_data['total_value'] = Product.objects.filter(user=request.user).aggregate(
-            total=Sum(F('quantity') * F('cost')))['total'] or 0
-
-    if preference.is_widget_enabled('recent_products'):
-        widget_data['recent_products'] = Product.objects.filter(
-            user=request.user).order_by('-created_at')[:5]
-
-    if preference.is_widget_enabled('categories_with_counts'):
-        widget_data['categories_with_counts'] = Category.objects.filter(user=request.user).annotate(
-            product_count=Count('products')).order_by('-product_count')[:5]
+    # Only fetch data for enabled widgets; values come from the widget cache
+    enabled_widgets = [widget_id for widget_id in preference.DEFAULT_DASHBOARD_WIDGETS
+                       if preference.is_widget_enabled(widget_id)]
+    widget_data = get_widget_data(request.user, enabled_widgets)
 
     # Get ordered widgets for display
     ordered_widgets = preference.get_ordered_widgets()
@@ -57,34 +46,19 @@ def product_list(request):
     products = Product.objects.filter(user=request.user)
     categories = Category.objects.filter(user=request.user)
 
-    # Search functionality
-    search_query = request.GET.get('search')
-    if search_query:
-        products = products.filter(
-            Q(name__icontains=search_query) |
-            Q(sku__icontains=search_query) |
-            Q(description__icontains=search_query)
-        )
-
-    # Category filter
-    category_id = request.GET.get('category')
-    if category_id:
-        products = products.filter(category_id=category_id)
-
-    # Status filter
-    status = request.GET.get('status')
-    if status:
-        products = products.filter(status=status)
-
-    # Low stock filter
-    if request.GET.get('low_stock'):
-        products = products.filter(quantity__lte=F('minimum_stock'))
+    # Search, category, status and low stock filters
+    products = filter_products(products, request.GET)
 
     products = products.select_related('category').order_by('name')
 
     # Handle export requests
     export_format = request.GET.get('export')
     if export_format:
+        # Large Excel/PDF exports are built by the export worker instead of this request
+        if export_format in ('excel', 'pdf') and is_large_export(products):
+            job = request_export(request.user, 'products', export_format, product_filter_params(request.GET))
+            return redirect('export_job_detail', pk=job.pk)
+
         if export_format == 'csv':
             return export_products_csv(products)
         elif export_format == 'excel':
@@ -92,8 +66,19 @@ def product_list(request):
         elif export_format == 'pdf':
             return export_products_pdf(products)
 
+    # Keyset pagination on (name, id), or on relevance when searching: constant cost for any page depth
+    page = keyset_paginate(
+        products,
+        after=request.GET.get('after'),
+        before=request.GET.get('before'),
+        page_size=get_page_size(request.GET.get('page_size')),
+        order_by='-search_rank' if request.GET.get('search') else 'name',
+    )
+
     context = {
-        'products': products,
+        'products': page,
+        'page': page,
+        'page_sizes': PAGE_SIZE_CHOICES,
         'categories': categories,
     }
     return render(request, 'products/product_list.html', context)
@@ -152,6 +137,10 @@ def category_list(request):
     # Handle export requests
     export_format = request.GET.get('export')
     if export_format:
+        if export_format in ('excel', 'pdf') and is_large_export(categories):
+            job = request_export(request.user, 'categories', export_format)
+            return redirect('export_job_detail', pk=job.pk)
+
         if export_format == 'csv':
             return export_categories_csv(categories)
         elif export_format == 'excel':
@@ -5,81 +5,83 @@ from django.db.models import Sum, Count, F, Q, Avg
 from django.utils import timezone
 from django.views.decorators.http import require_POST
 from django.core.serializers.json import DjangoJSONEncoder
+import heapq
 import json
 from datetime import datetime, timedelta
 import random  # For demo data
 from decimal import Decimal
 
-from .models import Product, Category, Sale, SaleItem, InventorySnapshot, SavedReport, UserPreference
+from .models import Product, Category, InventorySnapshot, SavedReport, UserPreference, DailySalesRollup
+from .analytics import get_product_performance, get_lowest_revenue_products, sales_time_series, GRANULARITIES
+from .caching import ANALYTICS_CACHE, cached_per_user
 
-@login_required
-def sales_trends(request):
-    # Get date range from request or use default (last 30 days)
-    days = int(request.GET.get('days', 30))
+# Longest ?days= window the analytics pages accept (about ten years)
+MAX_DAYS = 3650
+
+def get_days(value, default=None):
+    """Parse a ?days= value, falling back to the default and keeping it within 0..MAX_DAYS"""
+    try:
+        days = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0, min(days, MAX_DAYS))
+
+# Chart data is cached rather than the rendered pages, which carry the session's CSRF token
+@cached_per_user(ANALYTICS_CACHE)
+def sales_trends_data(user, days, granularity):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days)
 
-    # Get sales data for the period
-    sales = Sale.objects.filter(
-        user=request.user,
-        sale_date__date__gte=start_date,
-        sale_date__date__lte=end_date
-    ).order_by('sale_date')
-
     # For demo purposes, if no sales data exists, create some random data
+    sales = DailySalesRollup.objects.filter(
+        user=user,
+        date__gte=start_date,
+        date__lte=end_date
+    )
     if not sales.exists():
-        sales_data = generate_demo_sales_data(request.user, days)
+        sales_data = generate_demo_sales_data(user, days)
     else:
-        # Group sales by date
-        sales_by_date = {}
-        for sale in sales:
-            date_str = sale.sale_date.date().strftime('%Y-%m-%d')
-            if date_str in sales_by_date:
-                sales_by_date[date_str] += sale.total_amount
-            else:
-                sales_by_date[date_str] = sale.total_amount
-
-        # Create a list of dates and corresponding sales amounts
-        dates = []
-        amounts = []
-        current_date = start_date
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            dates.append(date_str)
-            amounts.append(float(sales_by_date.get(date_str, 0)))
-            current_date += timedelta(days=1)
-
-        sales_data = {
-            'dates': dates,
-            'amounts': amounts
-        }
+        # Totals come from the daily rollup, so a year of history is at most 365 rows
+        sales_data = sales_time_series(user, start_date, end_date, granularity)
 
-    context = {
+    return {
         'sales_data': json.dumps(sales_data, cls=DecimalEncoder),
-        'days': days,
         'total_sales': sum(sales_data['amounts']),
-        'avg_daily_sales': sum(sales_data['amounts']) / len(sales_data['amounts']) if sales_data['amounts'] else 0
+        'avg_daily_sales': sum(sales_data['amounts']) / max((end_date - start_date).days + 1, 1)
     }
 
-    return render(request, 'products/analytics/sales_trends.html', context)
-
 @login_required
-def inventory_value(request):
+def sales_trends(request):
     # Get date range from request or use default (last 30 days)
-    days = int(request.GET.get('days', 30))
+    days = get_days(request.GET.get('days'), 30)
+
+    granularity = request.GET.get('granularity', 'day')
+    if granularity not in GRANULARITIES:
+        granularity = 'day'
+
+    context = {
+        'days': days,
+        'granularity': granularity,
+        **sales_trends_data(request.user, days, granularity)
+    }
+
+    return render(request, 'products/analytics/sales_trends.html', context)
+
+@cached_per_user(ANALYTICS_CACHE)
+def inventory_value_data(user, days):
     end_date = timezone.now().date()
     start_date = end_date - timedelta(days=days)
 
     # Get inventory snapshots for the period
     snapshots = InventorySnapshot.objects.filter(
-        user=request.user,
+        user=user,
         date__gte=start_date,
         date__lte=end_date
     ).order_by('date')
 
     # For demo purposes, if no snapshot data exists, create some random data
     if not snapshots.exists():
-        inventory_data = generate_demo_inventory_data(request.user, days)
+        inventory_data = generate_demo_inventory_data(user, days)
     else:
         # Create a list of dates and corresponding inventory values
         dates = []
@@ -94,56 +96,76 @@ def inventory_value(request):
         }
 
     # Calculate current inventory value
-    current_value = Product.objects.filter(user=request.user).aggregate(
+    current_value = Product.objects.filter(user=user).aggregate(
         total=Sum(F('quantity') * F('cost')))['total'] or 0
 
-    context = {
+    return {
         'inventory_data': json.dumps(inventory_data, cls=DecimalEncoder),
-        'days': days,
         'current_value': current_value,
         'change_percentage': calculate_change_percentage(inventory_data['values'])
     }
 
-    return render(request, 'products/analytics/inventory_value.html', context)
-
 @login_required
-def product_performance(request):
-    # Get top and bottom performing products
-    products = Product.objects.filter(user=request.user)
+def inventory_value(request):
+    # Get date range from request or use default (last 30 days)
+    days = int(request.GET.get('days', 30))
 
-    # For demo purposes, if no sales data exists, create some random data
-    if not SaleItem.objects.filter(product__user=request.user).exists():
-        performance_data = generate_demo_performance_data(products)
-    else:
-        # Get sales data for each product
-        product_sales = {}
-        for product in products:
-            sales_count = SaleItem.objects.filter(product=product).aggregate(
-                total_quantity=Sum('quantity'),
-                total_revenue=Sum(F('quantity') * F('price'))
-            )
-            product_sales[product.id] = {
-                'name': product.name,
-                'quantity': sales_count['total_quantity'] or 0,
-                'revenue': float(sales_count['total_revenue'] or 0),
-                'profit_margin': product.profit_margin
-            }
+    context = {
+        'days': days,
+        **inventory_value_data(request.user, days)
+    }
+
+    return render(request, 'products/analytics/inventory_value.html', context)
+
+# Products shown in the revenue chart, and the most ?top= and ?bottom= may ask for
+PERFORMANCE_LIMIT = 50
 
-        # Sort products by revenue
-        sorted_products = sorted(product_sales.values(), key=lambda x: x['revenue'], reverse=True)
+def get_ranked_count(value, default=5):
+    """Parse a ?top= or ?bottom= value, falling back to the default and keeping it within 1..PERFORMANCE_LIMIT"""
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(count, PERFORMANCE_LIMIT))
+
+@cached_per_user(ANALYTICS_CACHE)
+def product_performance_data(user, days, top, bottom):
+    # Optional date window (all-time by default)
+    end_date = timezone.now().date()
+    start_date = end_date - timedelta(days=days) if days else None
 
+    # For demo purposes, if no sales data exists, create some random data
+    if not DailySalesRollup.objects.filter(user=user, product__isnull=False).exists():
+        demo_data = generate_demo_performance_data(Product.objects.filter(user=user))
+        top_products = get_top_products(demo_data, PERFORMANCE_LIMIT)
         performance_data = {
-            'products': [p['name'] for p in sorted_products],
-            'quantities': [p['quantity'] for p in sorted_products],
-            'revenues': [p['revenue'] for p in sorted_products],
-            'margins': [p['profit_margin'] for p in sorted_products]
+            'products': [name for name, revenue in top_products],
+            'revenues': [revenue for name, revenue in top_products],
         }
+        bottom_products = get_bottom_products(demo_data, bottom)
+    else:
+        # The database sorts and cuts the grouped rollup query: the highest earners for the chart
+        # (and the top list), and the lowest with the ordering reversed
+        performance_data = get_product_performance(user, start_date, end_date, PERFORMANCE_LIMIT)
+        bottom_products = get_lowest_revenue_products(user, bottom, start_date, end_date)
 
     # Convert Decimal objects to float for JSON serialization
-    context = {
+    return {
         'performance_data': json.dumps(performance_data, cls=DecimalEncoder),
-        'top_products': get_top_products(performance_data, 5),
-        'bottom_products': get_bottom_products(performance_data, 5)
+        'top_products': list(zip(performance_data['products'], performance_data['revenues']))[:top],
+        'bottom_products': bottom_products
+    }
+
+@login_required
+def product_performance(request):
+    # All-time unless a window is given
+    days = get_days(request.GET.get('days'))
+    top = get_ranked_count(request.GET.get('top'))
+    bottom = get_ranked_count(request.GET.get('bottom'))
+
+    context = {
+        'days': days,
+        **product_performance_data(request.user, days, top, bottom)
     }
 
     return render(request, 'products/analytics/product_performance.html', context)
@@ -309,24 +331,14 @@ def get_top_products(data, count):
     if not data or 'products' not in data or 'revenues' not in data:
         return []
 
-    # Combine product names and revenues
-    products = list(zip(data['products'], data['revenues']))
-
-    # Sort by revenue (descending)
-    sorted_products = sorted(products, key=lambda x: x[1], reverse=True)
-
-    # Return top N products
-    return sorted_products[:count]
+    # Bounded heap selection of the N highest revenues (no full sort)
+    products = zip(data['products'], data['revenues'])
+    return heapq.nlargest(count, products, key=lambda x: x[1])
 
 def get_bottom_products(data, count):
     if not data or 'products' not in data or 'revenues' not in data:
         return []
 
-    # Combine product names and revenues
-    products = list(zip(data['products'], data['revenues']))
-
-    # Sort by revenue (ascending)
-    sorted_products = sorted(products, key=lambda x: x[1])
-
-    # Return bottom N products
-    return sorted_products[:count]
+    # Bounded heap selection of the N lowest revenues (no full sort)
+    products = zip(data['products'], data['revenues'])
+    return heapq.nsmallest(count, products, key=lambda x: x[1])
@@ -9,8 +9,8 @@ from .models import UserPreference
 @login_required
 def dashboard_settings(request):
     """View for dashboard customization settings"""
-    # Get or create user preferences
-    preference, created = UserPreference.objects.get_or_create(user=request.user)
+    # Get user preferences (cached, see ThemeMiddleware)
+    preference = request.preferences
     
     # Get widget configurations
     widgets = preference.dashboard_widgets or preference.DEFAULT_DASHBOARD_WIDGETS
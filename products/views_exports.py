@@ -0,0 +1,35 @@
+from django.shortcuts import render, get_object_or_404
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse, FileResponse, Http404
+from django.urls import reverse
+
+from .models import ExportJob
+
+@login_required
+def export_job_detail(request, pk):
+    """Page that waits for a background export and offers the download"""
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+    return render(request, 'products/export_job.html', {'job': job})
+
+@login_required
+def export_job_status(request, pk):
+    """Polling endpoint for a background export"""
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user)
+    data = {
+        'id': job.pk,
+        'status': job.status,
+        'progress': job.progress,
+        'error': job.error,
+        'download_url': None,
+    }
+    if job.status == 'completed' and not job.is_expired:
+        data['download_url'] = reverse('export_job_download', args=[job.pk])
+    return JsonResponse(data)
+
+@login_required
+def export_job_download(request, pk):
+    """Serve the finished export file"""
+    job = get_object_or_404(ExportJob, pk=pk, user=request.user, status='completed')
+    if job.is_expired or not job.file:
+        raise Http404("This export has expired.")
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.file.name.rsplit('/', 1)[-1])
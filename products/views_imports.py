@@ -0,0 +1,44 @@
+from django.shortcuts import render
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+
+from .forms import ImportFileForm
+from .importers import import_products
+
+# Row errors shown on the page; the summary still counts all of them
+MAX_DISPLAYED_ERRORS = 200
+
+@login_required
+def product_import(request):
+    """Bulk create/update products from an uploaded CSV or Excel file"""
+    result = None
+    if request.method == 'POST':
+        form = ImportFileForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            dry_run = form.cleaned_data['dry_run']
+            try:
+                result = import_products(
+                    request.user, upload, upload.name,
+                    create_categories=form.cleaned_data['create_categories'],
+                    dry_run=dry_run,
+                )
+            except ValueError as e:
+                messages.error(request, str(e))
+            else:
+                summary = f'{result.created} created, {result.updated} updated, {len(result.errors)} rejected.'
+                if dry_run:
+                    messages.info(request, f'Validation only, nothing was saved: {summary}')
+                elif result.errors:
+                    messages.warning(request, f'Import finished with errors: {summary}')
+                else:
+                    messages.success(request, f'Import finished: {summary}')
+    else:
+        form = ImportFileForm()
+
+    return render(request, 'products/product_import.html', {
+        'form': form,
+        'result': result,
+        'errors': result.errors[:MAX_DISPLAYED_ERRORS] if result else [],
+        'max_displayed_errors': MAX_DISPLAYED_ERRORS,
+    })
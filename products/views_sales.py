@@ -0,0 +1,38 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from .sales import record_sale, SaleError
+
+@login_required
+@require_POST
+def sale_record(request):
+    """Record a sale from a POS: {"items": [{"sku": "...", "quantity": 2}, ...], "payment_method": "cash"}"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'errors': ['Invalid JSON body.']}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'errors': ['Expected a JSON object.']}, status=400)
+
+    try:
+        sale, levels = record_sale(
+            request.user,
+            data.get('items'),
+            customer_name=data.get('customer_name'),
+            customer_email=data.get('customer_email'),
+            payment_method=data.get('payment_method') or 'cash',
+            notes=data.get('notes'),
+        )
+    except SaleError as e:
+        return JsonResponse({'success': False, 'errors': e.errors}, status=400)
+
+    return JsonResponse({
+        'success': True,
+        'sale_id': sale.pk,
+        'invoice_number': str(sale.invoice_number),
+        'total_amount': str(sale.total_amount),
+        'levels': levels,
+    }, status=201)
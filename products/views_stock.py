@@ -0,0 +1,23 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from .stock import adjust_stock, StockAdjustmentError
+
+@login_required
+@require_POST
+def stock_adjust(request):
+    """Apply a batch of stock movements: {"adjustments": [{"sku": "...", "delta": 5}, ...]}"""
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'errors': ['Invalid JSON body.']}, status=400)
+
+    try:
+        levels = adjust_stock(request.user, data.get('adjustments') if isinstance(data, dict) else None)
+    except StockAdjustmentError as e:
+        return JsonResponse({'success': False, 'errors': e.errors}, status=400)
+
+    return JsonResponse({'success': True, 'levels': levels})
@@ -0,0 +1,177 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count, Sum, F, Q
+
+from .models import Product, Category
+
+
+# Scalar widgets computed from the user's products: widget id -> (aggregate expression, default).
+# All enabled metrics are merged into a single Product aggregate() query.
+PRODUCT_METRICS = {}
+
+
+def register_metric(widget_id, expression, default=0):
+    """Declare a scalar dashboard widget as an aggregate over the user's products"""
+    PRODUCT_METRICS[widget_id] = (expression, default)
+
+
+register_metric('total_products', Count('id'))
+register_metric('low_stock_products', Count('id', filter=Q(quantity__lte=F('minimum_stock'))))
+register_metric('total_value', Sum(F('quantity') * F('cost')))
+
+
+def compute_metrics(user, widget_ids):
+    """Values of the requested product metrics in one round-trip"""
+    expressions = {widget_id: PRODUCT_METRICS[widget_id][0]
+                   for widget_id in widget_ids if widget_id in PRODUCT_METRICS}
+    if not expressions:
+        return {}
+    result = Product.objects.filter(user=user).aggregate(**expressions)
+    return {
+        widget_id: PRODUCT_METRICS[widget_id][1] if result[widget_id] is None else result[widget_id]
+        for widget_id in expressions
+    }
+
+
+# Categories are a different table, so this count stays its own query
+def total_categories(user):
+    return Category.objects.filter(user=user).count()
+
+
+def recent_products(user):
+    return list(Product.objects.filter(user=user).order_by('-created_at').values(
+        'pk', 'name', 'created_at', 'quantity', 'price')[:5])
+
+
+def categories_with_counts(user):
+    return list(Category.objects.filter(user=user).annotate(
+        product_count=Count('products')).order_by('-product_count').values('pk', 'name', 'product_count')[:5])
+
+
+# Widgets that need their own query: widget id -> function computing its data.
+# Results of all widgets must be picklable plain data.
+WIDGET_PROVIDERS = {
+    'total_categories': total_categories,
+    'recent_products': recent_products,
+    'categories_with_counts': categories_with_counts,
+}
+
+
+def compute_widgets(user, widget_ids):
+    """Compute widget data, merging every product metric into a single query"""
+    data = compute_metrics(user, widget_ids)
+    for widget_id in widget_ids:
+        if widget_id not in data:
+            data[widget_id] = WIDGET_PROVIDERS[widget_id](user)
+    return data
+
+
+def widget_cache_ttl():
+    """Seconds a cached widget value is served as fresh"""
+    return getattr(settings, 'DASHBOARD_WIDGET_CACHE_TTL', 60)
+
+
+def widget_stale_ttl():
+    """Seconds after going stale during which a value is still served while it is refreshed"""
+    return getattr(settings, 'DASHBOARD_WIDGET_STALE_TTL', 300)
+
+
+def _version_key(user_id):
+    return f'products:dashboard:version:{user_id}'
+
+
+def _widget_key(user_id, version, widget_id):
+    return f'products:dashboard:{user_id}:{version}:{widget_id}'
+
+
+def _lock_key(widget_key):
+    return f'{widget_key}:refreshing'
+
+
+def widget_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), 1, None)
+        version = cache.get(_version_key(user_id), 1)
+    return version
+
+
+def invalidate_widgets(user_id):
+    """Drop every cached widget of a user by moving them to a new version"""
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.add(_version_key(user_id), 2, None)
+
+
+def _store(keys, data):
+    fresh_until = time.time() + widget_cache_ttl()
+    cache.set_many({key: {'value': data[widget_id], 'fresh_until': fresh_until}
+                    for widget_id, key in keys.items()},
+                   widget_cache_ttl() + widget_stale_ttl())
+
+
+def _refresh(user, keys):
+    try:
+        _store(keys, compute_widgets(user, list(keys)))
+    finally:
+        cache.delete_many([_lock_key(key) for key in keys.values()])
+
+
+def _refresh_in_background(user, keys):
+    def run():
+        try:
+            _refresh(user, keys)
+        finally:
+            close_old_connections()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def schedule_refresh(user, keys):
+    """Recompute stale widgets, skipping any another request is already refreshing"""
+    keys = {widget_id: key for widget_id, key in keys.items() if cache.add(_lock_key(key), 1, 30)}
+    if not keys:
+        return
+    if getattr(settings, 'DASHBOARD_WIDGET_REFRESH_ASYNC', True):
+        _refresh_in_background(user, keys)
+    else:
+        _refresh(user, keys)
+
+
+def get_widget_data(user, widget_ids):
+    """Data for the given widgets, served from the cache where possible.
+
+    Fresh values are returned as-is, stale values are returned while a
+    background thread recomputes them, and missing values are computed now.
+    """
+    widget_ids = [widget_id for widget_id in widget_ids
+                  if widget_id in PRODUCT_METRICS or widget_id in WIDGET_PROVIDERS]
+    version = widget_version(user.pk)
+    keys = {widget_id: _widget_key(user.pk, version, widget_id) for widget_id in widget_ids}
+    cached = cache.get_many(keys.values())
+
+    data = {}
+    missing = {}
+    stale = {}
+    now = time.time()
+    for widget_id, key in keys.items():
+        entry = cached.get(key)
+        if entry is None:
+            missing[widget_id] = key
+            continue
+        if entry['fresh_until'] < now:
+            stale[widget_id] = key
+        data[widget_id] = entry['value']
+
+    if missing:
+        computed = compute_widgets(user, list(missing))
+        _store(missing, computed)
+        data.update(computed)
+    if stale:
+        schedule_refresh(user, stale)
+    return data